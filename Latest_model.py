@@ -1,10 +1,12 @@
 import streamlit as st
 import json
-import re
-from google import genai
 from PIL import Image
-import PyPDF2
 from datetime import datetime
+from model_router import MODEL_TIERS
+from dietary_profile import derive_constraints, constraints_prompt
+from serialization import dumps_str
+from helios_core import (PROFILE_PROMPT, RECIPE_CONFIG, RECIPE_PAGE_SIZE, clean_json_response, create_client,
+                         document_text, parse_recipes, recipe_markdown, recipe_prompt)
 
 # --------------------------------------------------
 # PAGE CONFIG
@@ -71,8 +73,37 @@ st.markdown("""
 # GEMINI INITIALIZATION
 # --------------------------------------------------
 API_KEY = st.secrets["GEMINI_API_KEY"]
-client = genai.Client(api_key=API_KEY)
-MODEL_ID = "gemini-3-flash-preview"
+
+@st.cache_resource
+def get_router(api_key):
+    return create_client(api_key)
+
+client = get_router(API_KEY)
+MODEL_ID = MODEL_TIERS[0]
+
+def batch_recipes(batch_id):
+    return [r for r in st.session_state.recipe_history if r.get("batch") == batch_id]
+
+def generate_recipe_page(batch, images):
+    # One small page of structured recipes; names already in this batch are
+    # excluded from the prompt (and dropped if the model repeats them anyway)
+    shown = [r["name"] for r in batch_recipes(batch["id"])]
+    prompt = recipe_prompt(batch["constraints"], batch["page_size"], batch["meal"], batch["cooking_time"],
+                           batch["cuisines"], exclude=shown)
+    response = client.models.generate_content(model=MODEL_ID, contents=[prompt] + images, config=RECIPE_CONFIG)
+    recipes = parse_recipes(response.text, exclude=shown)
+    timestamp = datetime.now().isoformat()
+    for recipe in recipes:
+        # One history record per recipe so history can be filtered without regenerating
+        st.session_state.recipe_history.append({
+            "timestamp": timestamp,
+            "batch": batch["id"],
+            "meal": batch["meal"],
+            "cuisines": batch["cuisines"],
+            "num_images": len(images),
+            **recipe
+        })
+    return recipes
 
 # --------------------------------------------------
 # SESSION STATE INITIALIZATION
@@ -148,40 +179,20 @@ with tab1:
             st.info(f"📄 **File:** {uploaded_file.name} ({uploaded_file.size} bytes)")
             
             # Extract content
-            if uploaded_file.type == "text/plain":
-                content = uploaded_file.read().decode("utf-8")
-            else:
-                reader = PyPDF2.PdfReader(uploaded_file)
-                content = "\n".join(page.extract_text() or "" for page in reader.pages)
+            content = document_text(uploaded_file, uploaded_file.type == "text/plain")
             
             with st.expander("📖 View Raw Content"):
                 st.text_area("Document Content", content, height=200)
             
             if st.button("🔍 Analyze & Extract Health Data", type="primary"):
                 with st.spinner("🧠 AI is analyzing your clinical markers..."):
-                    prompt = """
-Extract clinical data and return STRICT JSON ONLY (no markdown, no extra text).
-
-Required format:
-{
-  "conditions": ["list of medical conditions"],
-  "lab_markers": {"marker_name": "value with unit"},
-  "medications": ["list of medications"],
-  "allergies": ["list of allergies or food restrictions"],
-  "dietary_restrictions": ["specific dietary needs"],
-  "summary": "brief health summary"
-}
-"""
-                    
                     try:
                         response = client.models.generate_content(
                             model=MODEL_ID,
-                            contents=[prompt, content]
+                            contents=[PROFILE_PROMPT, content]
                         )
                         
-                        # Clean and parse
-                        clean = re.sub(r"```json|```", "", response.text).strip()
-                        extracted_data = json.loads(clean)
+                        extracted_data = clean_json_response(response.text)
                         
                         # Store in session
                         st.session_state.clinical_data = extracted_data
@@ -235,7 +246,7 @@ Required format:
             st.markdown(f'<div class="metric-box"><h3>{len(markers)}</h3><p>Lab Markers</p></div>', unsafe_allow_html=True)
         
         with st.expander("🔍 View Full Profile Details"):
-            st.json(st.session_state.clinical_data)
+            st.json(dumps_str(st.session_state.clinical_data))
 
 # ==================================================
 # TAB 2: FRIDGE SCANNER (ENHANCED WITH MULTIPLE IMAGES)
@@ -295,12 +306,12 @@ with tab2:
             ["Dinner", "Lunch", "Breakfast", "Snack", "Dessert"]
         )
         
-        num_recipes = st.slider(
-            "Number of Recipes",
-            min_value=3,
-            max_value=15,
-            value=10,
-            help="How many recipe suggestions do you want?"
+        page_size = st.slider(
+            "Recipes per Page",
+            min_value=1,
+            max_value=5,
+            value=RECIPE_PAGE_SIZE,
+            help="Recipes are generated a page at a time; use 'Show more' for the next page"
         )
         
         cooking_time = st.select_slider(
@@ -313,76 +324,64 @@ with tab2:
     
     # Generate recipes button
     images_to_process = []
+    image_ids = []
     
     if uploaded_images:
         images_to_process.extend([Image.open(img) for img in uploaded_images])
+        image_ids.extend(img.file_id for img in uploaded_images)
     if camera_photo:
         images_to_process.append(Image.open(camera_photo))
+        image_ids.append(camera_photo.file_id)
     
     if images_to_process and st.button("🍽️ Generate Personalized Recipes", type="primary"):
+        # Compact constraints instead of the raw extraction JSON
+        st.session_state.recipe_batch = {
+            "id": datetime.now().isoformat(),
+            "constraints": constraints_prompt(derive_constraints(st.session_state.clinical_data)),
+            "page_size": page_size,
+            "meal": meal_type,
+            "cooking_time": cooking_time,
+            "cuisines": cuisine_type,
+            "image_ids": image_ids,
+        }
         with st.spinner("👨‍🍳 Chef Gemini is crafting your personalized recipes..."):
-            
-            health_context = json.dumps(
-                st.session_state.clinical_data or {"note": "No medical profile - using general healthy guidelines"},
-                indent=2
-            )
-            
-            cuisine_filter = f"\nPreferred cuisines: {', '.join(cuisine_type)}" if cuisine_type else ""
-            
-            recipe_prompt = f"""
-You are a professional medical nutritionist and chef with expertise in personalized meal planning.
-
-TASK:
-1. Carefully identify ALL ingredients visible in the provided images
-2. Consider the medical profile below to avoid contraindications
-3. Suggest {num_recipes} HEALTHY {meal_type.lower()} recipes that can be made with these ingredients
-4. Each recipe should take no more than {cooking_time} to prepare{cuisine_filter}
-
-MEDICAL PROFILE:
-{health_context}
-
-For EACH recipe, provide:
-- **Recipe Name** (creative and appetizing)
-- **Ingredients List** (from the images)
-- **Medical Benefits** (how it supports their health conditions)
-- **Preparation Time**
-- **Cooking Instructions** (step-by-step, clear)
-- **Chef's Tip** (pro technique or substitution)
-- **Nutritional Highlights** (key nutrients)
-
-Format each recipe clearly with headers and bullet points for easy reading.
-"""
-            
             try:
-                # Prepare content list
-                content_parts = [recipe_prompt] + images_to_process
-                
-                response = client.models.generate_content(
-                    model=MODEL_ID,
-                    contents=content_parts
-                )
-                
-                # Store in history
-                st.session_state.recipe_history.append({
-                    "timestamp": datetime.now().isoformat(),
-                    "num_images": len(images_to_process),
-                    "recipes": response.text
-                })
-                
-                st.markdown("---")
-                st.markdown("## 🍳 Your Personalized Recipes")
-                st.markdown(response.text)
-                
-                # Download option
+                if not generate_recipe_page(st.session_state.recipe_batch, images_to_process):
+                    st.warning("⚠️ No recipes could be generated from these photos.")
+            except Exception as e:
+                st.error(f"❌ Error generating recipes: {str(e)}")
+    
+    batch = st.session_state.get("recipe_batch")
+    if batch:
+        recipes = batch_recipes(batch["id"])
+        if recipes:
+            st.markdown("---")
+            st.markdown("## 🍳 Your Personalized Recipes")
+            for recipe in recipes:
+                with st.container(border=True):
+                    st.markdown(recipe_markdown(recipe))
+            
+            col_more, col_download = st.columns(2)
+            with col_more:
+                # More recipes only for the photos this batch was generated from
+                same_photos = image_ids == batch.get("image_ids")
+                more = st.button(f"➕ Show {batch['page_size']} More", key="more_recipes", disabled=not same_photos,
+                                 help=None if same_photos else "Photos changed: generate a new batch for these ingredients")
+                if more:
+                    with st.spinner("👨‍🍳 Finding different recipes..."):
+                        try:
+                            if generate_recipe_page(batch, images_to_process):
+                                st.rerun()
+                            st.info("No new recipes found for these ingredients.")
+                        except Exception as e:
+                            st.error(f"❌ Error generating recipes: {str(e)}")
+            with col_download:
                 st.download_button(
                     label="📥 Download Recipes",
-                    data=response.text,
-                    file_name=f"recipes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
-                    mime="text/plain"
+                    data="\n\n---\n\n".join(recipe_markdown(r) for r in recipes),
+                    file_name=f"recipes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md",
+                    mime="text/markdown"
                 )
-                
-            except Exception as e:
-                st.error(f"❌ Error generating recipes: {str(e)}")
     
     elif not images_to_process:
         st.info("👆 Please upload ingredient photos or take a picture to get started!")
@@ -400,7 +399,7 @@ with tab3:
         if st.session_state.clinical_history:
             for idx, record in enumerate(reversed(st.session_state.clinical_history)):
                 with st.expander(f"📄 {record['filename']} - {record['timestamp'][:10]}"):
-                    st.json(record['data'])
+                    st.json(dumps_str(record['data']))
                     if st.button(f"📋 Load This Profile", key=f"load_{idx}"):
                         st.session_state.clinical_data = record['data']
                         st.success("✅ Profile loaded!")
@@ -411,9 +410,19 @@ with tab3:
     with col2:
         st.markdown("### 🍽️ Recipe History")
         if st.session_state.recipe_history:
-            for idx, record in enumerate(reversed(st.session_state.recipe_history)):
-                with st.expander(f"🥗 {record['timestamp'][:10]} - {record['num_images']} images"):
-                    st.markdown(record['recipes'])
+            history = st.session_state.recipe_history
+            meals = sorted({r["meal"] for r in history if r.get("meal")})
+            meal_filter = st.multiselect("Filter by meal", meals, key="recipe_meal_filter")
+            search = st.text_input("Search recipes", key="recipe_search").strip().lower()
+            for idx, record in enumerate(reversed(history)):
+                if meal_filter and record.get("meal") not in meal_filter:
+                    continue
+                if search and search not in dumps_str(record).lower():
+                    continue
+                # Records from before structured recipes hold one markdown blob
+                title = record.get("name") or f"{record['num_images']} images"
+                with st.expander(f"🥗 {record['timestamp'][:10]} - {title}"):
+                    st.markdown(recipe_markdown(record) if "name" in record else record['recipes'])
         else:
             st.info("No recipes generated yet.")
     
@@ -422,6 +431,7 @@ with tab3:
         if st.checkbox("⚠️ Are you sure? This cannot be undone."):
             st.session_state.clinical_history = []
             st.session_state.recipe_history = []
+            st.session_state.recipe_batch = None
             st.session_state.ingredient_images = []
             st.success("✅ History cleared!")
             st.rerun()
@@ -1,13 +1,25 @@
 import streamlit as st
-import json
-import re
-from google import genai
+import altair as alt
 from PIL import Image
-from pypdf import PdfReader
 from datetime import datetime
 import os
+import numpy as np
 import pandas as pd
 import streamlit.components.v1 as components
+from data_export import ndjson_export, lab_parquet_export
+from lab_archive import archive_extraction
+from barcode_lookup import load_database, scan_products, find_conflicts
+from request_coalescing import coalesced_generate, coalescing_stats, content_key
+from model_router import MODEL_TIERS
+from incremental_analysis import SectionIndex, incremental_extract
+from dietary_profile import derive_constraints, constraints_prompt, prompt_tokens
+from serialization import dumps, dumps_str, loads
+from reference_ranges import CRITICAL_LOW, STATUS_LABELS, HistoryFlags, range_label
+from trend_series import DEFAULT_WINDOW, MAX_CHART_POINTS, RollingTrends, downsample
+from helios_core import (RECIPE_CONFIG, create_client, document_text, extract_profile, kitchen_markdown,
+                         kitchen_prompt, parse_kitchen, recipe_markdown)
+from sampling_profiler import LATENCY_THRESHOLD, PROFILE_MODES, default_mode, profile_request
+from speculative_prefetch import Prefetcher
 
 # PAGE CONFIG
 st.set_page_config(
@@ -69,31 +81,85 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # HELPER FUNCTIONS
-def extract_numeric(text):
-    match = re.search(r"[-+]?\d*\.\d+|\d+", str(text))
-    return float(match.group()) if match else None
-
 def load_users():
     if os.path.exists("users.json"):
         try:
-            with open("users.json") as f:
-                return json.load(f)
-        except json.JSONDecodeError:
+            with open("users.json", "rb") as f:
+                return loads(f.read())
+        except ValueError:
             return {}
     return {}
 
 def save_users(users):
-    with open("users.json", "w") as f:
-        json.dump(users, f)
+    with open("users.json", "wb") as f:
+        f.write(dumps(users))
+
+@st.cache_resource
+def get_nutrition_db():
+    return load_database()
+
+@st.cache_resource
+def get_section_index():
+    return SectionIndex()
+
+STATUS_COLORS = {"normal": "#2e7d32", "low": "#f9a825", "high": "#f9a825",
+                 "critical low": "#c62828", "critical high": "#c62828", "unknown": "#9e9e9e"}
+
+def get_rolling_trends(flags, window):
+    # Rolling stats are pushed per new reading and kept across reruns
+    trends = st.session_state.get("rolling_trends") or RollingTrends(window)
+    st.session_state.rolling_trends = trends.update(flags, window)
+    return trends
 
-def clean_json_response(text):
-    clean = re.sub(r"```json\s*", "", text)
-    clean = re.sub(r"```\s*", "", clean)
-    clean = clean.strip()
-    json_match = re.search(r'\{[\s\S]*\}', clean)
-    if json_match:
-        clean = json_match.group()
-    return json.loads(clean)
+def series_frame(series, marker, indexed=False):
+    # Downsampled chart rows for one marker; critical readings are always kept
+    dates = pd.to_datetime(pd.Series(series.dates), errors="coerce")
+    x = dates.astype("int64").to_numpy() if dates.notna().all() else np.arange(len(dates))
+    values = np.asarray(series.values, dtype=float)
+    idx = downsample(x, values, MAX_CHART_POINTS, keep=np.asarray(series.status) >= CRITICAL_LOW)
+    frame = pd.DataFrame({
+        "Date": dates.iloc[idx].to_numpy(),
+        "Value": values[idx],
+        "Mean": np.asarray(series.mean)[idx],
+        "Min": np.asarray(series.min)[idx],
+        "Max": np.asarray(series.max)[idx],
+        "Status": [STATUS_LABELS[series.status[i]] for i in idx],
+        "Marker": marker,
+    })
+    if indexed and values[0]:
+        frame[["Value", "Mean", "Min", "Max"]] *= 100 / values[0]
+    return frame
+
+def get_range_flags():
+    # Only reports added since the last rerun are evaluated; changing sex/age re-evaluates all
+    flags = st.session_state.get("range_flags") or HistoryFlags()
+    sex = {"Female": "F", "Male": "M"}.get(st.session_state.get("ref_sex"))
+    flags.update(st.session_state.clinical_history, sex, st.session_state.get("ref_age"))
+    st.session_state.range_flags = flags
+    return flags
+
+def request_profile_mode():
+    # ?profile=auto|always on the URL profiles a single request; the sidebar sets the session mode
+    mode = st.query_params.get("profile")
+    if mode in PROFILE_MODES:
+        return mode
+    return st.session_state.get("profile_mode", default_mode())
+
+def profiled(name, fn):
+    # Wraps a model job so the sampler runs on whichever thread executes it:
+    # the prefetch worker on a hit, the script thread on a miss. The mode is
+    # read here because the worker cannot touch st.session_state.
+    mode = request_profile_mode()
+    def run():
+        with profile_request(name, mode) as prof:
+            result = fn()
+        return result, prof
+    return run
+
+def note_profile(prof):
+    if prof.path:
+        st.session_state.last_profile = prof.path
+        st.caption(f"Profile captured ({prof.elapsed:.1f}s, {prof.samples} samples): {prof.path}")
 
 # LOGIN LOGIC
 users = load_users()
@@ -155,8 +221,20 @@ except KeyError:
     st.error("GEMINI_API_KEY not found in secrets. Please add it to your Streamlit secrets.")
     st.stop()
 
-client = genai.Client(api_key=API_KEY)
-MODEL_ID = "gemini-3-flash-preview"  # Changed to available model
+@st.cache_resource
+def get_router(api_key):
+    # One router per server process so latency/error profiles are shared by all sessions
+    return create_client(api_key)
+
+client = get_router(API_KEY)
+MODEL_ID = MODEL_TIERS[0]  # preferred tier; the router hedges/falls back down MODEL_TIERS
+
+@st.cache_resource
+def get_prefetcher():
+    # Model calls started on upload, handed over when the user clicks Analyze
+    return Prefetcher()
+
+prefetcher = get_prefetcher()
 
 # SESSION STATE
 session_keys = {"clinical_data": None, "clinical_history": [], "recipe_history": []}
@@ -195,6 +273,20 @@ with st.sidebar:
         st.warning("No Profile Loaded")
         st.caption("Upload a medical report to get personalized recommendations.")
     
+    with st.expander("Reference Ranges", expanded=False):
+        st.selectbox("Sex", ["Unspecified", "Female", "Male"], key="ref_sex")
+        st.number_input("Age", min_value=0, max_value=119, value=None, step=1, key="ref_age")
+    flagged = get_range_flags().latest_flags()
+    if flagged:
+        st.markdown("**Flagged Markers:**")
+        for item in flagged[:5]:
+            unit = f" {item['unit']}" if item["unit"] else ""
+            text = f"{item['marker'].title()}: {item['value']:g}{unit} ({item['status']})"
+            if item["critical"]:
+                st.error(text)
+            else:
+                st.warning(text)
+    
     st.markdown("---")
     st.markdown("### Activity Summary")
     col1, col2 = st.columns(2)
@@ -202,6 +294,22 @@ with st.sidebar:
         st.metric("Reports", len(st.session_state.clinical_history))
     with col2:
         st.metric("Recipes", len(st.session_state.recipe_history))
+    flight = coalescing_stats()
+    if flight["deduplicated"]:
+        st.caption(f"Shared model calls: {flight['deduplicated']} of {flight['calls']} deduplicated")
+    prefetch = prefetcher.snapshot()
+    if prefetch["hits"] + prefetch["misses"]:
+        st.caption(f"Prefetch hit rate: {prefetch['hit_rate']:.0%}, ~{prefetch['saved_s']:.0f}s of waiting saved")
+    with st.expander("Model Routing", expanded=False):
+        st.json(dumps_str(client.snapshot()))
+    with st.expander("Profiling", expanded=False):
+        st.selectbox("Sampling profiler", PROFILE_MODES, index=PROFILE_MODES.index(default_mode()), key="profile_mode")
+        st.caption(f"auto keeps profiles of requests slower than {LATENCY_THRESHOLD:g}s; always keeps every one")
+        last_profile = st.session_state.get("last_profile")
+        if last_profile and os.path.exists(last_profile):
+            with open(last_profile, "rb") as f:
+                st.download_button("Download last profile", f.read(), file_name=os.path.basename(last_profile),
+                                   mime="text/plain", use_container_width=True)
     st.markdown("---")
     st.caption("HELIOS v2.0 - Health Intelligence System")
 
@@ -228,11 +336,9 @@ with tab1:
     
     if uploaded_file:
         try:
-            if uploaded_file.type == "text/plain":
-                content = uploaded_file.read().decode("utf-8")
-            else:
-                reader = PdfReader(uploaded_file)
-                content = "\n".join(page.extract_text() or "" for page in reader.pages)
+            with profile_request("report_upload", request_profile_mode()) as prof:
+                content = document_text(uploaded_file, uploaded_file.type == "text/plain")
+            note_profile(prof)
             
             if not content.strip():
                 st.error("Could not extract text from the file.")
@@ -241,33 +347,42 @@ with tab1:
                     st.text_area("Content", content[:3000] + "..." if len(content) > 3000 else content, height=200, disabled=True)
                 st.success(f"Successfully extracted {len(content)} characters from {uploaded_file.name}")
                 
+                # Extraction starts speculatively as soon as the text is decoded
+                username = st.session_state.username
+                section_index = get_section_index()
+                extract_report = profiled("report_analysis", lambda: incremental_extract(
+                    content,
+                    username,
+                    lambda text: extract_profile(client, MODEL_ID, text),
+                    section_index
+                ))
+                report_key = content_key(MODEL_ID, [content])
+                prefetcher.start(username, "report", report_key, extract_report)
+                
                 if st.button("Analyze & Extract Health Markers", type="primary", use_container_width=True):
                     with st.spinner("Processing your medical report..."):
-                        prompt = """You are a medical data extraction specialist. Analyze this medical report carefully and extract all relevant clinical information.
-
-Return the data in this EXACT JSON format (no additional text):
-{
-    "conditions": ["list of diagnosed conditions"],
-    "lab_markers": {"marker_name": "value with units"},
-    "medications": ["list of medications"],
-    "summary": "Brief 2-3 sentence summary"
-}
-
-Extract ALL lab values with units. If a field has no data, use empty list [] or object {}.
-Analyze this report:"""
-                        
                         try:
-                            response = client.models.generate_content(model=MODEL_ID, contents=[prompt, content])
-                            extracted_data = clean_json_response(response.text)
+                            # Sections repeated from this user's earlier reports are not re-sent
+                            ((extracted_data, reuse), prof), prefetched = prefetcher.run(username, "report", report_key, extract_report)
+                            note_profile(prof)
                             
                             st.session_state.clinical_data = extracted_data
-                            st.session_state.clinical_history.append({
+                            history_entry = {
                                 "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"),
                                 "filename": uploaded_file.name,
                                 "data": extracted_data
-                            })
+                            }
+                            st.session_state.clinical_history.append(history_entry)
+                            try:
+                                archive_extraction(st.session_state.username, history_entry)
+                            except Exception as e:
+                                st.warning(f"Could not archive lab markers: {str(e)}")
                             
                             st.success("Medical Profile Updated Successfully!")
+                            if reuse["reused"]:
+                                st.info(f"Reused {reuse['reused']} of {reuse['sections']} sections from earlier reports ({reuse['skipped_fraction']:.0%} of text skipped)")
+                            if prefetched["hit"]:
+                                st.caption(f"Started on upload: ~{prefetched['saved_s']:.1f}s of analysis already done")
                             st.balloons()
                             
                             st.markdown("---")
@@ -306,6 +421,8 @@ Analyze this report:"""
                             st.error(f"Analysis failed: {str(e)}")
         except Exception as e:
             st.error(f"Error reading file: {str(e)}")
+    else:
+        prefetcher.discard(st.session_state.username, "report")
 
 # TAB 2: KITCHEN SCANNER
 with tab2:
@@ -314,6 +431,8 @@ with tab2:
     
     if st.session_state.clinical_data:
         st.success("Using your health profile for personalized recommendations")
+        raw_tokens, compact_tokens = prompt_tokens(st.session_state.clinical_data)
+        st.caption(f"Dietary constraints: ~{compact_tokens} prompt tokens (full extraction ~{raw_tokens})")
     else:
         st.warning("No medical profile found. Upload a report for personalized suggestions.")
     
@@ -324,16 +443,19 @@ with tab2:
         st.markdown("### Image Capture")
         input_mode = st.radio("Select Image Source:", ["Upload Photos", "Use Camera"], horizontal=True, key="fridge_input_mode")
         fridge_images = []
+        image_ids = []
         
         if input_mode == "Use Camera":
             cam_img = st.camera_input("Capture a photo of your kitchen inventory")
             if cam_img:
                 fridge_images = [Image.open(cam_img)]
+                image_ids = [cam_img.file_id]
                 st.success("Photo captured successfully")
         else:
             files = st.file_uploader("Upload photos of your kitchen", type=["jpg", "png", "jpeg"], accept_multiple_files=True, key="fridge_uploader")
             if files:
                 fridge_images = [Image.open(f) for f in files]
+                image_ids = [f.file_id for f in files]
                 st.success(f"{len(files)} image(s) uploaded")
                 if len(fridge_images) <= 4:
                     cols = st.columns(len(fridge_images))
@@ -348,28 +470,85 @@ with tab2:
         dietary = st.multiselect("Dietary Restrictions", ["Vegetarian", "Vegan", "Gluten-Free", "Dairy-Free", "Low-Carb", "Keto", "Nut-Free", "Low-Sodium"], key="dietary_select")
         cooking_time = st.select_slider("Available Cooking Time", options=["15 mins", "30 mins", "45 mins", "1 hour", "1+ hours"], value="30 mins")
     
+    # Barcodes are resolved locally; the model is told not to re-detect those products
+    barcode_scan = None
+    if fridge_images:
+        if st.session_state.get("barcode_scan_ids") != image_ids:
+            with profile_request("barcode_scan", request_profile_mode()) as prof:
+                st.session_state.barcode_scan = scan_products(fridge_images, get_nutrition_db())
+            st.session_state.barcode_scan_ids = image_ids
+            note_profile(prof)
+        barcode_scan = st.session_state.barcode_scan
+    
+    if fridge_images and get_nutrition_db() is None:
+        st.caption("Barcode lookup is off: build nutrition_db.jsonl with `python barcode_lookup.py <Open Food Facts export>`")
+    if barcode_scan and barcode_scan["identified"]:
+        st.markdown("### Packaged Products (Barcode)")
+        for product in barcode_scan["identified"]:
+            conflicts = find_conflicts(product, st.session_state.clinical_data)
+            nutrients = ", ".join(f"{k.replace('_', ' ')}: {v}" for k, v in (product.get("nutrients") or {}).items())
+            st.markdown(f"**{product.get('name', product.get('barcode'))}** - {nutrients}")
+            for conflict in conflicts:
+                st.warning(f"{product.get('name', 'Product')}: {conflict}")
+    
     st.markdown("---")
     if fridge_images:
+        known_products = ", ".join(p.get("name", p.get("barcode", "")) for p in barcode_scan["identified"]) or "None"
+        constraints = constraints_prompt(derive_constraints(st.session_state.clinical_data))
+        prefix, request = kitchen_prompt(constraints, dietary, cuisine, meal, cooking_time, known_products)
+        # All photos go to the model: barcoded items sit next to loose produce
+        images = fridge_images
+        username = st.session_state.username
+        analyze_kitchen = profiled("kitchen_analysis", lambda: coalesced_generate(
+            client, MODEL_ID, [prefix, request] + images, RECIPE_CONFIG))
+        kitchen_key = content_key(MODEL_ID, [prefix, request, *image_ids])
+        # Speculative analysis runs once per upload with the preferences at upload
+        # time; changing them afterwards makes Analyze a miss instead of re-prefetching
+        if st.session_state.get("kitchen_prefetch_ids") != image_ids:
+            prefetcher.start(username, "kitchen", kitchen_key, analyze_kitchen)
+            st.session_state.kitchen_prefetch_ids = image_ids
+        
         if st.button("Analyze & Generate Personalized Recipes", type="primary", use_container_width=True):
             with st.spinner("Analyzing ingredients..."):
-                prompt = f"""Analyze these kitchen images. User context: Health Profile: {json.dumps(st.session_state.clinical_data or {})}, Dietary: {", ".join(dietary) or "None"}, Cuisine: {", ".join(cuisine) or "Any"}, Meal: {meal}, Time: {cooking_time}
-
-Provide:
-1. DETECTED INGREDIENTS - List all visible items
-2. NUTRITIONAL GAP ANALYSIS - What's missing for their health needs?
-3. SHOPPING RECOMMENDATIONS - 5-7 items (ESSENTIAL/RECOMMENDED/OPTIONAL)
-4. PERSONALIZED RECIPES (3) - Name, Time, Difficulty, Ingredients (available vs need), Instructions, Health Benefits"""
-                
                 try:
-                    response = client.models.generate_content(model=MODEL_ID, contents=[prompt] + fridge_images)
+                    (response, prof), prefetched = prefetcher.run(username, "kitchen", kitchen_key, analyze_kitchen)
+                    note_profile(prof)
                     st.markdown("---")
                     st.markdown("## Personalized Kitchen Analysis")
-                    st.markdown(response.text)
-                    st.session_state.recipe_history.append({"timestamp": datetime.now().isoformat(), "meal": meal, "cuisines": cuisine, "content": response.text})
-                    st.success("Analysis saved to history")
+                    timestamp = datetime.now().isoformat()
+                    try:
+                        analysis = parse_kitchen(response.text)
+                    except ValueError:
+                        analysis = None
+                    if analysis is None:
+                        # Replies that are not JSON are shown and kept whole
+                        st.markdown(response.text)
+                        st.session_state.recipe_history.append({"timestamp": timestamp, "meal": meal, "cuisines": cuisine, "content": response.text})
+                    else:
+                        st.markdown(kitchen_markdown(analysis))
+                        for recipe in analysis["recipes"]:
+                            with st.container(border=True):
+                                st.markdown(recipe_markdown(recipe))
+                            # One history record per recipe, same shape as Latest_model's
+                            st.session_state.recipe_history.append({
+                                "timestamp": timestamp,
+                                "batch": timestamp,
+                                "meal": meal,
+                                "cuisines": cuisine,
+                                "num_images": len(images),
+                                **recipe
+                            })
+                    if analysis is None or analysis["recipes"]:
+                        st.success("Analysis saved to history")
+                    else:
+                        st.warning("No recipes could be generated from these photos.")
+                    if prefetched["hit"]:
+                        st.caption(f"Started on upload: ~{prefetched['saved_s']:.1f}s of analysis already done")
                 except Exception as e:
                     st.error(f"Analysis failed: {str(e)}")
     else:
+        prefetcher.discard(st.session_state.username, "kitchen")
+        st.session_state.kitchen_prefetch_ids = None
         st.info("Please upload photos to begin analysis.")
 
 # TAB 3: HISTORY & TRENDS
@@ -382,25 +561,16 @@ with tab3:
     st.markdown("###  Lab Marker Trends")
     
     if st.session_state.clinical_history:
-        # Prepare data for charting
-        all_markers = []
-        for entry in st.session_state.clinical_history:
-            date = entry["timestamp"]
-            markers = entry["data"].get("lab_markers", {})
-            for m_name, m_val in markers.items():
-                num_val = extract_numeric(m_val)
-                if num_val is not None:
-                    all_markers.append({
-                        "Date": date, 
-                        "Marker": m_name.lower().strip(), 
-                        "Value": num_val
-                    })
+        # Readings flagged against the local reference table (see reference_ranges.py)
+        flags = get_range_flags()
         
-        if all_markers:
-            df = pd.DataFrame(all_markers)
-            unique_markers = sorted(df["Marker"].unique())
+        if flags.records:
+            col_select, col_overlay, col_window = st.columns([2, 2, 1])
             
-            col_select, col_info = st.columns([2, 1])
+            with col_window:
+                window = st.select_slider("Rolling window", options=[1, 3, 7, 14, 30], value=DEFAULT_WINDOW, key="trend_window")
+            trends = get_rolling_trends(flags, window)
+            unique_markers = trends.markers()
             
             with col_select:
                 selected_marker = st.selectbox(
@@ -409,53 +579,90 @@ with tab3:
                     key="trend_marker_select"
                 )
             
-            with col_info:
-                marker_count = len(df[df["Marker"] == selected_marker])
-                st.metric("Data Points", marker_count)
+            with col_overlay:
+                overlay = st.multiselect("Compare with:", [m for m in unique_markers if m != selected_marker],
+                                         max_selections=4, key="trend_overlay")
             
-            plot_df = df[df["Marker"] == selected_marker].sort_values("Date")
+            series = trends.series[selected_marker]
+            compare = [selected_marker] + overlay
+            indexed = len(compare) > 1 and st.checkbox("Index each marker to its first reading (= 100)", value=True, key="trend_indexed")
+            with profile_request("trend_chart", request_profile_mode()) as prof:
+                plot_df = pd.concat([series_frame(trends.series[m], m, indexed) for m in compare], ignore_index=True)
+            note_profile(prof)
             
             col_chart, col_stats = st.columns([2, 1])
             
             with col_chart:
-                st.subheader(f" {selected_marker.title()} Over Time")
-                st.line_chart(data=plot_df, x="Date", y="Value", height=350)
+                st.subheader(f" {' vs '.join(m.title() for m in compare)} Over Time")
+                base = alt.Chart(plot_df).encode(x=alt.X("Date:T", title=None))
+                if len(compare) == 1:
+                    low, high = flags.range_for(selected_marker)
+                    layers = [
+                        base.mark_line(color="#4a90d9").encode(y=alt.Y("Value:Q", title="Value")),
+                        base.mark_line(color="#7b1fa2", strokeDash=[4, 3]).encode(y="Mean:Q"),
+                        base.mark_circle(size=70).encode(
+                            y="Value:Q",
+                            color=alt.Color("Status:N", scale=alt.Scale(domain=list(STATUS_COLORS), range=list(STATUS_COLORS.values()))),
+                            tooltip=["Date:T", "Value:Q", "Mean:Q", "Min:Q", "Max:Q", "Status:N"],
+                        ),
+                    ]
+                    if window > 1:
+                        layers.insert(0, base.mark_area(opacity=0.12, color="#7b1fa2").encode(y="Min:Q", y2="Max:Q"))
+                    if low == low or high == high:
+                        band = plot_df.assign(Low=low if low == low else plot_df["Value"].min(),
+                                              High=high if high == high else plot_df["Value"].max())
+                        layers.insert(0, alt.Chart(band).mark_area(opacity=0.15, color="#2e7d32").encode(x="Date:T", y="Low:Q", y2="High:Q"))
+                else:
+                    layers = [
+                        base.mark_line().encode(y=alt.Y("Value:Q", title="Index (first = 100)" if indexed else "Value"), color="Marker:N"),
+                        base.mark_circle(size=40).encode(y="Value:Q", color="Marker:N", tooltip=["Marker:N", "Date:T", "Value:Q", "Status:N"]),
+                    ]
+                st.altair_chart(alt.layer(*layers), use_container_width=True)
+                shown = len(plot_df[plot_df["Marker"] == selected_marker])
+                if shown < len(series.values):
+                    st.caption(f"Showing {shown} of {len(series.values)} readings (downsampled; out-of-range readings always shown)")
             
             with col_stats:
                 st.subheader(" Statistics")
                 
-                if len(plot_df) >= 1:
-                    current_val = plot_df["Value"].iloc[-1]
-                    st.metric(label="Latest Value", value=f"{current_val:.2f}")
+                current_val = series.values[-1]
+                st.metric(label="Latest Value", value=f"{current_val:.2f}")
+                latest_status = STATUS_LABELS[series.status[-1]]
+                if latest_status.startswith("critical"):
+                    st.error(f" Latest reading is {latest_status}")
+                elif latest_status in ("low", "high"):
+                    st.warning(f" Latest reading is {latest_status} (range {range_label(*flags.range_for(selected_marker))})")
+                
+                if len(series.values) > 1:
+                    first_val = series.values[0]
+                    diff = current_val - first_val
+                    percent = (diff / first_val) * 100 if first_val != 0 else 0
+                    
+                    st.metric(
+                        label="First Value",
+                        value=f"{first_val:.2f}"
+                    )
+                    
+                    st.metric(
+                        label="Total Change",
+                        value=f"{abs(diff):.2f}",
+                        delta=f"{percent:+.1f}%"
+                    )
                     
-                    if len(plot_df) > 1:
-                        first_val = plot_df["Value"].iloc[0]
-                        diff = current_val - first_val
-                        percent = (diff / first_val) * 100 if first_val != 0 else 0
-                        
-                        st.metric(
-                            label="First Value",
-                            value=f"{first_val:.2f}"
-                        )
-                        
-                        delta_color = "normal"
-                        st.metric(
-                            label="Total Change",
-                            value=f"{abs(diff):.2f}",
-                            delta=f"{percent:+.1f}%"
-                        )
-                        
-                        st.metric(label="Readings", value=len(plot_df))
-                        
-                        # Trend indicator
-                        if percent > 5:
-                            st.warning(" Trending UP")
-                        elif percent < -5:
-                            st.info(" Trending DOWN")
-                        else:
-                            st.success(" Stable")
+                    st.metric(label="Readings", value=len(series.values))
+                    if window > 1:
+                        st.metric(label=f"Rolling Mean ({window})", value=f"{series.mean[-1]:.2f}")
+                        st.caption(f"Window min {series.min[-1]:.2f} / max {series.max[-1]:.2f}")
+                    
+                    # Trend indicator
+                    if percent > 5:
+                        st.warning(" Trending UP")
+                    elif percent < -5:
+                        st.info(" Trending DOWN")
                     else:
-                        st.info("Upload more reports to see trends")
+                        st.success(" Stable")
+                else:
+                    st.info("Upload more reports to see trends")
         else:
             st.info("No numeric lab markers found in your reports. Upload a report with lab values to see trends.")
     else:
@@ -473,7 +680,7 @@ with tab3:
         if st.session_state.clinical_history:
             for i, record in enumerate(reversed(st.session_state.clinical_history)):
                 with st.expander(f" {record['timestamp']} - {record.get('filename', 'Report')}", expanded=False):
-                    st.json(record['data'])
+                    st.json(dumps_str(record['data']))
             
             if st.button(" Clear All Reports", key="clear_reports"):
                 st.session_state.clinical_history = []
@@ -485,11 +692,18 @@ with tab3:
     with col_h2:
         st.markdown("####  Recipe Suggestions")
         if st.session_state.recipe_history:
-            for i, rec in enumerate(reversed(st.session_state.recipe_history)):
+            history = st.session_state.recipe_history
+            meals = sorted({r["meal"] for r in history if r.get("meal")})
+            meal_filter = st.multiselect("Filter by meal", meals, key="recipe_meal_filter")
+            for i, rec in enumerate(reversed(history)):
+                if meal_filter and rec.get("meal") not in meal_filter:
+                    continue
                 meal_type = rec.get('meal', 'Meal')
                 timestamp = rec['timestamp'][:10]
-                with st.expander(f" {meal_type} - {timestamp}", expanded=False):
-                    st.markdown(rec.get('content', ''))
+                # Unparsed replies have no name and hold the whole analysis in "content"
+                title = f" {rec['name']} ({meal_type})" if "name" in rec else f" {meal_type}"
+                with st.expander(f"{title} - {timestamp}", expanded=False):
+                    st.markdown(recipe_markdown(rec) if "name" in rec else rec.get('content', ''))
             
             if st.button(" Clear Recipe History", key="clear_recipes"):
                 st.session_state.recipe_history = []
@@ -502,25 +716,34 @@ with tab3:
     st.markdown("### Export Your Data")
     
     col_exp1, col_exp2 = st.columns(2)
+    stamp = datetime.now().strftime('%Y%m%d')
     
+    # Exports are built lazily on click and served as bytes (see data_export.py)
     with col_exp1:
         if st.session_state.clinical_history:
-            export_data = json.dumps(st.session_state.clinical_history, indent=2, default=str)
             st.download_button(
-                label="Download Medical Data",
-                data=export_data,
-                file_name=f"medical_history_{datetime.now().strftime('%Y%m%d')}.json",
-                mime="application/json"
+                label="Download Medical Data (NDJSON)",
+                data=ndjson_export(st.session_state.clinical_history),
+                file_name=f"medical_history_{stamp}.ndjson",
+                mime="application/x-ndjson",
+                on_click="ignore"
+            )
+            st.download_button(
+                label="Download Lab Markers (Parquet)",
+                data=lab_parquet_export(st.session_state.clinical_history),
+                file_name=f"lab_markers_{stamp}.parquet",
+                mime="application/vnd.apache.parquet",
+                on_click="ignore"
             )
     
     with col_exp2:
         if st.session_state.recipe_history:
-            export_data = json.dumps(st.session_state.recipe_history, indent=2, default=str)
             st.download_button(
-                label="Download Recipes",
-                data=export_data,
-                file_name=f"recipe_history_{datetime.now().strftime('%Y%m%d')}.json",
-                mime="application/json"
+                label="Download Recipes (NDJSON)",
+                data=ndjson_export(st.session_state.recipe_history),
+                file_name=f"recipe_history_{stamp}.ndjson",
+                mime="application/x-ndjson",
+                on_click="ignore"
             )
     
     st.markdown('</div>', unsafe_allow_html=True)
@@ -0,0 +1,192 @@
+import argparse
+import gzip
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Optional
+
+from dietary_profile import derive_constraints
+from serialization import dumps, loads
+
+try:
+    from pyzbar.pyzbar import decode as zbar_decode
+except ImportError:  # pyzbar installed but the zbar shared library is missing
+    zbar_decode = None
+
+# ================= CONFIG =================
+NUTRITION_DB = "nutrition_db.jsonl"   # one product per line, see build_database()
+DECODE_WORKERS = 4
+
+# Source for the database: the Open Food Facts JSONL export (ODbL licensed),
+# https://static.openfoodfacts.org/data/openfoodfacts-products.jsonl.gz
+# Build it with: python barcode_lookup.py openfoodfacts-products.jsonl.gz [--country en:india]
+# Open Food Facts nutriment key -> (our nutrient key, factor from grams)
+OFF_NUTRIENTS = {
+    "sodium": ("sodium_mg", 1000),
+    "potassium": ("potassium_mg", 1000),
+    "phosphorus": ("phosphorus_mg", 1000),
+    "caffeine": ("caffeine_mg", 1000),
+    "vitamin-k": ("vitamin_k_mcg", 1_000_000),
+    "sugars": ("sugar_g", 1),
+    "carbohydrates": ("carbohydrates_g", 1),
+    "saturated-fat": ("saturated_fat_g", 1),
+    "fiber": ("fiber_g", 1),
+}
+
+
+# ================= NUTRITION DATABASE =================
+class NutritionDB:
+    # Products stay on disk behind an mmap; only a barcode -> (offset, length)
+    # dict lives in memory, so each lookup is one hash probe plus one slice.
+    def __init__(self, path: str = NUTRITION_DB):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else None
+        self.index = self._build_index()
+
+    def _build_index(self) -> dict:
+        index = {}
+        if self._map is None:
+            return index
+        offset = 0
+        for line in iter(self._map.readline, b""):
+            if line.strip():
+                barcode = loads(line).get("barcode")
+                if barcode:
+                    index[str(barcode)] = (offset, len(line))
+            offset += len(line)
+        return index
+
+    def get(self, barcode: str) -> Optional[dict]:
+        loc = self.index.get(barcode)
+        if loc is None:
+            return None
+        offset, length = loc
+        return loads(self._map[offset:offset + length])
+
+    def __len__(self):
+        return len(self.index)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+
+def build_database(products: Iterable[dict], path: str = NUTRITION_DB) -> int:
+    count = 0
+    with open(path, "wb") as f:
+        for product in products:
+            f.write(dumps(product) + b"\n")
+            count += 1
+    return count
+
+
+def _off_number(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def off_product(raw: dict) -> Optional[dict]:
+    # One Open Food Facts record -> our product shape with per-serving
+    # nutrients (the dietary limits are per serving). Per-100g values are
+    # scaled by serving_quantity when the export has no per-serving figure.
+    code, name = str(raw.get("code") or "").strip(), str(raw.get("product_name") or "").strip()
+    if not code or not name:
+        return None
+    nutriments = raw.get("nutriments") or {}
+    serving = _off_number(raw.get("serving_quantity"))
+    nutrients = {}
+    for key, (ours, factor) in OFF_NUTRIENTS.items():
+        amount = _off_number(nutriments.get(f"{key}_serving"))
+        if amount is None and serving:
+            per_100g = _off_number(nutriments.get(f"{key}_100g"))
+            amount = per_100g * serving / 100 if per_100g is not None else None
+        if amount is not None:
+            nutrients[ours] = round(amount * factor, 2)
+    allergens = [tag.split(":", 1)[-1].replace("-", " ") for tag in raw.get("allergens_tags") or []]
+    return {"barcode": code, "name": name, "nutrients": nutrients, "allergens": allergens}
+
+
+def read_off_export(path: str, country: Optional[str] = None) -> Iterator[dict]:
+    # Streams the (optionally gzipped) export; `country` is an OFF tag such as "en:india"
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            raw = loads(line)
+            if country and country not in (raw.get("countries_tags") or []):
+                continue
+            product = off_product(raw)
+            if product is not None:
+                yield product
+
+
+def load_database(path: str = NUTRITION_DB) -> Optional[NutritionDB]:
+    return NutritionDB(path) if os.path.exists(path) else None
+
+
+# ================= BARCODE DECODING =================
+def _decode_one(image) -> List[str]:
+    if zbar_decode is None:
+        return []
+    return [symbol.data.decode("utf-8", errors="ignore") for symbol in zbar_decode(image)]
+
+
+def decode_barcodes(images: list) -> List[List[str]]:
+    # zbar releases the GIL while scanning, so images decode in parallel.
+    if not images:
+        return []
+    with ThreadPoolExecutor(max_workers=min(DECODE_WORKERS, len(images))) as pool:
+        return list(pool.map(_decode_one, images))
+
+
+# ================= HEALTH CONFLICTS =================
+def find_conflicts(product: dict, clinical_data: Optional[dict]) -> List[str]:
+    constraints = derive_constraints(clinical_data)
+    conflicts = []
+    nutrients = product.get("nutrients") or {}
+    for nutrient, limit, reason in constraints.nutrient_limits:
+        amount = nutrients.get(nutrient)
+        if amount is not None and amount > limit:
+            conflicts.append(f"{nutrient.replace('_', ' ')} {amount} exceeds {limit:g} ({reason})")
+
+    allergies = [a.lower() for a in constraints.allergies]
+    for allergen in product.get("allergens") or []:
+        if any(a in allergen.lower() or allergen.lower() in a for a in allergies):
+            conflicts.append(f"contains {allergen} (allergy)")
+    return conflicts
+
+
+# ================= SCAN =================
+def scan_products(images: list, db: Optional[NutritionDB]) -> dict:
+    # Returns the products identified locally and the barcodes that were not
+    # in the database. Callers still send every image to the vision model, as
+    # a photo with a known barcode usually shows loose produce too, and pass
+    # the identified products in the prompt as "do not re-detect". Health
+    # conflicts are left to find_conflicts() so a cached scan stays valid when
+    # clinical_data changes.
+    identified, unknown_codes = [], []
+    for codes in decode_barcodes(images):
+        for code in codes:
+            product = db.get(code) if db else None
+            if product is None:
+                unknown_codes.append(code)
+            else:
+                identified.append(product)
+    return {"identified": identified, "unknown_codes": unknown_codes}
+
+
+# ================= MAIN =================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the local barcode nutrition database from Open Food Facts")
+    parser.add_argument("export", help="openfoodfacts-products.jsonl(.gz), downloaded from Open Food Facts")
+    parser.add_argument("--country", help="keep only products tagged with this country, e.g. en:india")
+    parser.add_argument("--out", default=NUTRITION_DB)
+    args = parser.parse_args()
+
+    count = build_database(read_off_export(args.export, args.country), args.out)
+    print(f"✅ {count} products written to {args.out}")
@@ -0,0 +1,197 @@
+import argparse
+import glob
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Iterator, Optional
+
+from health_report_analyser import API_KEY, EXTRACTION_PROMPT, MODEL_NAME, check_report
+from lab_archive import ARCHIVE_DIR, archive_extraction, compact
+from result_log import ResultLog, RESULT_LOG
+from serialization import dumps, dumps_str, loads
+
+# ================= CONFIG =================
+# Not requests.jsonl: that name is reserved for the team's backlog file.
+BATCH_REQUESTS_FILE = "batch_requests.jsonl"
+POLL_INTERVAL = 30.0
+POLL_TIMEOUT = 24 * 3600.0
+
+DONE_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED"}
+FAILED_STATES = {"JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+
+
+# ================= RENDER =================
+def render_requests(source_dir: str, out_path: str = BATCH_REQUESTS_FILE, pattern: str = "*.txt") -> dict:
+    # One JSONL line per report, keyed by its path relative to source_dir so
+    # results can be joined back to the file that produced them.
+    sources = {}
+    with open(out_path, "wb") as out:
+        for path in sorted(glob.glob(os.path.join(source_dir, "**", pattern), recursive=True)):
+            key = os.path.relpath(path, source_dir)
+            with open(path, "r", encoding="utf-8") as f:
+                content = f.read()
+            line = {
+                "key": key,
+                "request": {
+                    "contents": [{"role": "user", "parts": [{"text": EXTRACTION_PROMPT}, {"text": content}]}],
+                    "generation_config": {"temperature": 0.1},
+                },
+            }
+            out.write(dumps(line) + b"\n")
+            sources[key] = path
+    return sources
+
+
+# ================= BACKENDS =================
+class GeminiBatchBackend:
+    def __init__(self, client=None):
+        if client is None:
+            from google import genai
+            client = genai.Client(api_key=API_KEY)
+        self.client = client
+
+    def submit(self, requests_path: str, model: str = MODEL_NAME) -> str:
+        uploaded = self.client.files.upload(
+            file=requests_path,
+            config={"display_name": os.path.basename(requests_path), "mime_type": "jsonl"},
+        )
+        job = self.client.batches.create(model=model, src=uploaded.name,
+                                         config={"display_name": f"helios-extract-{int(time.time())}"})
+        return job.name
+
+    def state(self, job_name: str) -> str:
+        return self.client.batches.get(name=job_name).state.name
+
+    def results(self, job_name: str) -> Iterator[str]:
+        job = self.client.batches.get(name=job_name)
+        data = self.client.files.download(file=job.dest.file_name)
+        for line in data.decode("utf-8").splitlines():
+            if line.strip():
+                yield line
+
+
+class LocalBatchServer:
+    # Stand-in for the batch API: jobs run on a background thread and answer
+    # each request with responder(prompt_parts) -> text. Used for tests and dry runs.
+    def __init__(self, responder: Callable[[list], str], delay: float = 0.0):
+        self.responder = responder
+        self.delay = delay
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, requests_path: str, model: str = MODEL_NAME) -> str:
+        name = f"batches/local-{uuid.uuid4().hex[:12]}"
+        with self._lock:
+            self._jobs[name] = {"state": "JOB_STATE_PENDING", "output": []}
+        threading.Thread(target=self._run, args=(name, requests_path), daemon=True).start()
+        return name
+
+    def _run(self, name: str, requests_path: str):
+        job = self._jobs[name]
+        job["state"] = "JOB_STATE_RUNNING"
+        time.sleep(self.delay)
+        with open(requests_path, "r", encoding="utf-8") as f:
+            for line in f:
+                request = loads(line)
+                parts = [p.get("text", "") for p in request["request"]["contents"][0]["parts"]]
+                try:
+                    text = self.responder(parts)
+                    result = {"key": request["key"],
+                              "response": {"candidates": [{"content": {"parts": [{"text": text}]}}]}}
+                except Exception as e:
+                    result = {"key": request["key"], "error": {"message": str(e)}}
+                job["output"].append(dumps_str(result))
+        job["state"] = "JOB_STATE_SUCCEEDED"
+
+    def state(self, job_name: str) -> str:
+        return self._jobs[job_name]["state"]
+
+    def results(self, job_name: str) -> Iterator[str]:
+        yield from self._jobs[job_name]["output"]
+
+
+# ================= POLL & COLLECT =================
+def wait_for_job(backend, job_name: str, interval: float = POLL_INTERVAL, timeout: float = POLL_TIMEOUT) -> str:
+    deadline = time.monotonic() + timeout
+    while True:
+        state = backend.state(job_name)
+        if state in DONE_STATES:
+            return state
+        if state in FAILED_STATES:
+            raise RuntimeError(f"Batch job {job_name} ended in {state}")
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Batch job {job_name} still {state} after {timeout:.0f}s")
+        time.sleep(interval)
+
+
+def _response_text(result: dict) -> Optional[str]:
+    try:
+        parts = result["response"]["candidates"][0]["content"]["parts"]
+    except (KeyError, IndexError, TypeError):
+        return None
+    return "".join(p.get("text", "") for p in parts)
+
+
+def collect_results(lines: Iterator[str], sources: dict, out_path: str = RESULT_LOG,
+                    archive_root: str = ARCHIVE_DIR) -> dict:
+    # Streams result lines through MedicalReport validation into the result
+    # log, one record per source file; never holds the whole set in memory.
+    # Reports that fail MedicalReport validation are logged as returned but
+    # counted invalid; only valid ones feed the lab archive, compacted at the end.
+    counts = {"ok": 0, "invalid": 0, "failed": 0, "archived_rows": 0, "archive_errors": 0}
+    log = ResultLog(out_path)
+    try:
+        for line in lines:
+            result = loads(line)
+            key = result.get("key")
+            text = _response_text(result)
+            if text is None:
+                report, valid = {"error": (result.get("error") or {}).get("message", "No response returned")}, False
+                counts["failed"] += 1
+            else:
+                report, valid = check_report(text)
+                counts["ok" if valid else "invalid"] += 1
+            log.append({**report, "source_key": key, "source": sources.get(key)})
+            if valid:
+                try:
+                    counts["archived_rows"] += archive_extraction(report.get("patient_name"), report, archive_root)
+                except Exception:
+                    counts["archive_errors"] += 1
+    finally:
+        log.close()
+    if counts["archived_rows"]:
+        compact(archive_root)
+    return counts
+
+
+def run_batch(source_dir: str, backend, model: str = MODEL_NAME, interval: float = POLL_INTERVAL,
+              requests_path: str = BATCH_REQUESTS_FILE, results_path: str = RESULT_LOG,
+              archive_root: str = ARCHIVE_DIR) -> dict:
+    sources = render_requests(source_dir, requests_path)
+    if not sources:
+        return {"submitted": 0}
+    job_name = backend.submit(requests_path, model)
+    print(f"⏳ Submitted {len(sources)} reports as {job_name}")
+    state = wait_for_job(backend, job_name, interval)
+    counts = collect_results(backend.results(job_name), sources, results_path, archive_root)
+    return {"submitted": len(sources), "job": job_name, "state": state, **counts}
+
+
+# ================= MAIN =================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk offline extraction through the Gemini batch API")
+    parser.add_argument("source_dir", help="directory of .txt reports (searched recursively)")
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="poll interval in seconds")
+    parser.add_argument("--local", action="store_true", help="use the local stand-in server instead of Gemini")
+    args = parser.parse_args()
+
+    if args.local:
+        backend = LocalBatchServer(lambda parts: dumps_str({"report_type": "OTHER", "clinical_summary": parts[-1][:200]}))
+        args.interval = min(args.interval, 0.5)
+    else:
+        backend = GeminiBatchBackend()
+
+    summary = run_batch(args.source_dir, backend, args.model, args.interval)
+    print(f"\n✅ {summary}")
@@ -0,0 +1,67 @@
+import argparse
+import json
+import random
+import timeit
+
+from medical_models import MedicalReport
+import serialization
+
+# ================= SAMPLE DATA =================
+MARKERS = ["Hemoglobin", "Glucose", "HbA1c", "LDL", "HDL", "Creatinine", "Potassium", "TSH", "Vitamin D", "ALT"]
+
+
+def sample_report(i: int) -> dict:
+    rng = random.Random(i)
+    return {
+        "report_type": "LAB_REPORT",
+        "patient_name": f"Patient {i % 50}",
+        "date": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "lab_results": [
+            {"test_name": m, "value": f"{rng.uniform(1, 200):.1f}", "unit": "mg/dL", "is_abnormal": rng.random() < 0.2}
+            for m in MARKERS
+        ],
+        "medications": [{"name": "Metformin", "dosage": "500 mg", "frequency": "twice daily"}],
+        "clinical_summary": "Routine follow-up. " * 8,
+    }
+
+
+# ================= BENCHMARKS =================
+def _time(fn, repeat: int) -> float:
+    # Best of 5 runs, in microseconds per call
+    return min(timeit.repeat(fn, number=repeat, repeat=5)) / repeat * 1e6
+
+
+def run(reports: int, repeat: int) -> list:
+    records = [sample_report(i) for i in range(reports)]
+    raw = [json.dumps(r) for r in records]
+    models = [MedicalReport.model_validate(r) for r in records]
+    encoded_json = serialization.dumps_str(records)
+
+    cases = [
+        ("validate: model_validate_json", lambda: [MedicalReport.model_validate_json(r) for r in raw],
+         lambda: [serialization.parse_report(r) for r in raw]),
+        ("dump: model_dump -> json.dumps", lambda: [json.dumps(m.model_dump(mode="json")) for m in models],
+         lambda: [serialization.dumps(serialization.report_dict(m)) for m in models]),
+        ("encode list", lambda: json.dumps(records, default=str), lambda: serialization.dumps(records)),
+        ("decode list", lambda: json.loads(encoded_json), lambda: serialization.loads(encoded_json)),
+    ]
+    results = []
+    for name, baseline, fast in cases:
+        base_us, fast_us = _time(baseline, repeat), _time(fast, repeat)
+        results.append({"case": name, "stdlib_us": round(base_us, 1), "fast_us": round(fast_us, 1),
+                        "speedup": round(base_us / fast_us, 2) if fast_us else None})
+    return results
+
+
+# ================= MAIN =================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare stdlib JSON against the serialization fast paths")
+    parser.add_argument("--reports", type=int, default=200, help="synthetic reports per payload")
+    parser.add_argument("--repeat", type=int, default=20, help="calls per timing run")
+    args = parser.parse_args()
+
+    print(f"orjson: {'yes' if serialization.orjson else 'no'}, "
+          f"{args.reports} reports, JSON {len(serialization.dumps(list(map(sample_report, range(args.reports))))):,} bytes")
+    print(f"{'case':34}{'stdlib us':>12}{'fast us':>12}{'speedup':>10}")
+    for row in run(args.reports, args.repeat):
+        print(f"{row['case']:34}{row['stdlib_us']:>12.1f}{row['fast_us']:>12.1f}{row['speedup']:>9.2f}x")
@@ -0,0 +1,67 @@
+import io
+from itertools import islice
+from typing import Callable, Iterable, Iterator
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from helios_core import iter_lab_rows
+from serialization import dumps
+
+# ================= CONFIG =================
+CHUNK_SIZE = 500    # records per NDJSON chunk / Parquet row group
+
+LAB_SCHEMA = pa.schema([
+    ("date", pa.string()),
+    ("marker", pa.string()),
+    ("value", pa.float64()),
+    ("unit", pa.string()),
+])
+
+
+# ================= HELPERS =================
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    it = iter(items)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+# ================= STREAMING WRITERS =================
+def iter_ndjson(records: Iterable[dict], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    for batch in _batched(records, chunk_size):
+        yield b"".join(dumps(rec) + b"\n" for rec in batch)
+
+
+def write_lab_parquet(rows: Iterable[dict], sink, chunk_size: int = CHUNK_SIZE) -> int:
+    written = 0
+    with pq.ParquetWriter(sink, LAB_SCHEMA) as writer:
+        for batch in _batched(rows, chunk_size):
+            writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=LAB_SCHEMA))
+            written += len(batch)
+    return written
+
+
+# ================= DEFERRED EXPORTS =================
+# Both factories return zero-argument callables for st.download_button(data=...),
+# so nothing is serialized until the user actually clicks download. The history
+# list is copied up front because the callable runs outside the script thread.
+# Limit: Streamlit reads the callable's result fully before serving it, so a
+# finished export is held in memory as one bytes object (about the size of the
+# session history it came from). Chunking only bounds the encoder's working set.
+def ndjson_export(records: list) -> Callable:
+    snapshot = list(records)
+    return lambda: b"".join(iter_ndjson(snapshot))
+
+
+def lab_parquet_export(history: list) -> Callable:
+    snapshot = list(history)
+
+    def build():
+        out = io.BytesIO()
+        write_lab_parquet(iter_lab_rows(snapshot), out)
+        return out.getvalue()
+
+    return build
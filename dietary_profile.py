@@ -0,0 +1,252 @@
+import re
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict
+
+from helios_core import estimate_tokens, split_value_unit
+from reference_ranges import _convert, canonical_marker
+from serialization import dumps, loads
+
+# ================= RULES =================
+# Keys are matched as lowercase substrings of the extracted condition names.
+# Limits are per serving.
+CONDITION_RULES = {
+    "diabet": {"limits": {"sugar_g": 10, "carbohydrates_g": 30},
+               "avoid": ["sugary drinks", "refined flour", "sweets"],
+               "goals": ["low glycaemic load", "high fibre"]},
+    "hypertension": {"limits": {"sodium_mg": 400},
+                     "avoid": ["pickles", "processed meats", "added salt"],
+                     "goals": ["DASH-style meals", "potassium-rich vegetables"]},
+    "blood pressure": {"limits": {"sodium_mg": 400},
+                       "avoid": ["processed meats", "added salt"],
+                       "goals": ["DASH-style meals"]},
+    "kidney": {"limits": {"potassium_mg": 300, "sodium_mg": 400, "phosphorus_mg": 250},
+               "avoid": ["bananas", "potatoes", "cola", "processed cheese"],
+               "goals": ["moderate protein"]},
+    "cholesterol": {"limits": {"saturated_fat_g": 5},
+                    "avoid": ["fried food", "butter", "fatty red meat"],
+                    "goals": ["soluble fibre", "unsaturated fats"]},
+    "lipid": {"limits": {"saturated_fat_g": 5},
+              "avoid": ["fried food", "fatty red meat"],
+              "goals": ["soluble fibre"]},
+    "gerd": {"limits": {"caffeine_mg": 0},
+             "avoid": ["spicy food", "citrus", "coffee", "chocolate", "late heavy meals"],
+             "goals": ["small low-fat meals"]},
+    "reflux": {"limits": {"caffeine_mg": 0},
+               "avoid": ["spicy food", "citrus", "coffee"],
+               "goals": ["small low-fat meals"]},
+    "anxiety": {"limits": {"caffeine_mg": 0},
+                "avoid": ["energy drinks", "excess coffee"],
+                "goals": ["steady blood sugar", "magnesium-rich foods"]},
+    "celiac": {"limits": {}, "avoid": ["wheat", "barley", "rye"], "goals": ["strictly gluten-free"]},
+    "anemia": {"limits": {}, "avoid": ["tea with meals"], "goals": ["iron-rich foods with vitamin C"]},
+    "gout": {"limits": {}, "avoid": ["organ meats", "shellfish", "beer"], "goals": ["low purine"]},
+}
+
+# Medications are matched on whole words against generic and brand names;
+# the rule key is the label shown as the reason for a limit.
+MEDICATION_RULES = {
+    "warfarin": {"names": ["warfarin", "coumadin", "jantoven"], "limits": {"vitamin_k_mcg": 50},
+                 "interaction": "warfarin: steady, low vitamin K (kale, spinach, broccoli)"},
+    "statin": {"names": ["atorvastatin", "simvastatin", "lovastatin", "lipitor", "zocor", "mevacor", "altoprev"],
+               "limits": {}, "interaction": "atorvastatin/simvastatin/lovastatin: no grapefruit"},
+    "spironolactone": {"names": ["spironolactone", "aldactone"], "limits": {"potassium_mg": 300},
+                       "interaction": "spironolactone: no salt substitutes"},
+    "lisinopril": {"names": ["lisinopril", "prinivil", "zestril"], "limits": {"potassium_mg": 300},
+                   "interaction": "lisinopril: no salt substitutes"},
+    "metformin": {"names": ["metformin", "glucophage", "fortamet", "glumetza"], "limits": {},
+                  "interaction": "metformin: limit alcohol; take with meals"},
+    "levothyroxine": {"names": ["levothyroxine", "synthroid", "levoxyl", "unithroid", "euthyrox"], "limits": {},
+                      "interaction": "levothyroxine: separate from soy, calcium and high-fibre meals by 4h"},
+    "maoi": {"names": ["maoi", "phenelzine", "nardil", "tranylcypromine", "parnate", "isocarboxazid",
+                       "marplan", "selegiline", "emsam"], "limits": {},
+             "interaction": "MAOIs: avoid aged cheese, cured meats and other tyramine-rich foods"},
+    "lorazepam": {"names": ["lorazepam", "ativan"], "limits": {}, "interaction": "lorazepam: avoid alcohol"},
+    "alprazolam": {"names": ["alprazolam", "xanax"], "limits": {},
+                   "interaction": "alprazolam: avoid alcohol and grapefruit"},
+    "omeprazole": {"names": ["omeprazole", "prilosec", "losec"], "limits": {},
+                   "interaction": "omeprazole: long-term use lowers B12/magnesium absorption"},
+}
+_MEDICATION_RES = {key: re.compile(r"\b(?:" + "|".join(rule["names"]) + r")\b")
+                   for key, rule in MEDICATION_RULES.items()}
+
+# Goals that mean eating more of a nutrient; dropped when a rule limits it
+GOAL_NUTRIENTS = {
+    "potassium-rich vegetables": "potassium_mg",
+    "magnesium-rich foods": "magnesium_mg",
+    "high fibre": "fiber_g",
+    "soluble fibre": "fiber_g",
+}
+
+# (canonical marker, comparison, threshold in CANONICAL_UNITS, condition key it
+# implies). Names and units go through reference_ranges, so "Hemoglobin A1c" is
+# hba1c, glucose in mmol/L is converted, and readings in a unit the table cannot
+# convert (creatinine clearance in mL/min) imply nothing.
+MARKER_RULES = [
+    ("hba1c", ">=", 6.5, "diabet"),
+    ("glucose", ">=", 126, "diabet"),
+    ("ldl", ">=", 160, "cholesterol"),
+    ("total cholesterol", ">=", 240, "cholesterol"),
+    ("triglycerides", ">=", 200, "lipid"),
+    ("potassium", ">", 5.2, "kidney"),
+    ("egfr", "<", 60, "kidney"),
+    ("creatinine", ">", 1.3, "kidney"),
+    ("uric acid", ">", 7.0, "gout"),
+    ("hemoglobin", "<", 12.0, "anemia"),
+]
+
+
+# ================= CONSTRAINT PROFILE =================
+class DietaryConstraints(BaseModel):
+    # Shared through the memo cache, so every field is immutable
+    model_config = ConfigDict(frozen=True)
+
+    nutrient_limits: Tuple[Tuple[str, float, str], ...] = ()   # (nutrient, per-serving max, rule)
+    avoid: Tuple[str, ...] = ()
+    interactions: Tuple[str, ...] = ()
+    goals: Tuple[str, ...] = ()
+    allergies: Tuple[str, ...] = ()
+    restrictions: Tuple[str, ...] = ()
+    # Passed through as extracted when no rule knows them
+    other_conditions: Tuple[str, ...] = ()
+    other_medications: Tuple[str, ...] = ()
+
+
+def _add_limits(limits: dict, new: dict, reason: str):
+    for nutrient, limit in new.items():
+        if nutrient not in limits or limit < limits[nutrient][0]:
+            limits[nutrient] = (limit, reason)
+
+
+def _extend_unique(target: list, items):
+    for item in items:
+        if item not in target:
+            target.append(item)
+
+
+def _tighten(items: List[str]) -> List[str]:
+    # Drops items covered by a shorter one ("excess coffee" by "coffee")
+    lowered = [i.lower() for i in items]
+    return [item for item, low in zip(items, lowered)
+            if not any(other != low and f" {other} " in f" {low} " for other in lowered)]
+
+
+def _marker_items(data: dict):
+    # (name, value, unit) from both extraction shapes
+    for name, raw in (data.get("lab_markers") or {}).items():
+        yield (name, *split_value_unit(raw))
+    for result in data.get("lab_results") or []:
+        if isinstance(result, dict) and result.get("test_name"):
+            value, unit = split_value_unit(result.get("value"))
+            yield result["test_name"], value, result.get("unit") or unit
+
+
+def _flagged_conditions(data: dict) -> List[str]:
+    found = []
+    for name, value, unit in _marker_items(data):
+        marker = canonical_marker(name)
+        if marker is None or value is None:
+            continue
+        value = _convert(marker, value, unit)
+        if value != value:  # unit the table cannot convert
+            continue
+        for rule_marker, op, threshold, condition in MARKER_RULES:
+            if rule_marker == marker and (value >= threshold if op == ">=" else
+                                          value > threshold if op == ">" else value < threshold):
+                found.append(condition)
+    return found
+
+
+def _apply(rule: dict, reason: str, limits: dict, avoid: list, goals: list):
+    _add_limits(limits, rule["limits"], reason)
+    _extend_unique(avoid, rule["avoid"])
+    _extend_unique(goals, rule["goals"])
+
+
+@lru_cache(maxsize=256)
+def _derive(profile_json: bytes) -> DietaryConstraints:
+    data = loads(profile_json)
+    limits, avoid, goals, interactions = {}, [], [], []
+    other_conditions, other_medications = [], []
+
+    matched = []
+    for condition in (str(c) for c in data.get("conditions") or []):
+        keys = [k for k in CONDITION_RULES if k in condition.lower()]
+        if keys:
+            _extend_unique(matched, keys)
+        else:
+            _extend_unique(other_conditions, [condition])
+    _extend_unique(matched, _flagged_conditions(data))
+    for keyword in matched:
+        _apply(CONDITION_RULES[keyword], keyword, limits, avoid, goals)
+
+    for medication in data.get("medications") or []:
+        name = str(medication.get("name") if isinstance(medication, dict) else medication)
+        keys = [k for k, pattern in _MEDICATION_RES.items() if pattern.search(name.lower())]
+        if not keys:
+            _extend_unique(other_medications, [name])
+        for keyword in keys:
+            rule = MEDICATION_RULES[keyword]
+            _add_limits(limits, rule["limits"], keyword)
+            _extend_unique(interactions, [rule["interaction"]])
+
+    allergies, restrictions = [], []
+    _extend_unique(allergies, [str(a) for a in data.get("allergies") or []])
+    _extend_unique(restrictions, [str(r) for r in data.get("dietary_restrictions") or []])
+    return DietaryConstraints(
+        nutrient_limits=tuple((n, limit, reason) for n, (limit, reason) in limits.items()),
+        avoid=tuple(_tighten(avoid)),
+        interactions=tuple(interactions),
+        # A goal that raises a limited nutrient contradicts the limit
+        goals=tuple(g for g in goals if GOAL_NUTRIENTS.get(g) not in limits),
+        allergies=tuple(allergies),
+        restrictions=tuple(restrictions),
+        other_conditions=tuple(other_conditions),
+        other_medications=tuple(other_medications),
+    )
+
+
+def derive_constraints(clinical_data: Optional[dict]) -> DietaryConstraints:
+    # Memoized on the canonical JSON of the profile, so repeated recipe
+    # requests with the same clinical_data reuse one compiled object.
+    if not clinical_data:
+        return DietaryConstraints()
+    return _derive(dumps(clinical_data, sort_keys=True))
+
+
+# ================= PROMPT =================
+def _limit_text(nutrient: str, limit: float) -> str:
+    # "vitamin_k_mcg", 50 -> "vitamin k 50mcg"
+    name, _, unit = nutrient.rpartition("_")
+    return f"{name.replace('_', ' ')} {limit:g}{unit}"
+
+
+def constraints_prompt(constraints: DietaryConstraints) -> str:
+    lines = []
+    if constraints.nutrient_limits:
+        limits = ", ".join(_limit_text(n, v) for n, v, _ in constraints.nutrient_limits)
+        lines.append(f"Max per serving: {limits}")
+    if constraints.avoid:
+        lines.append(f"Avoid: {', '.join(constraints.avoid)}")
+    if constraints.allergies:
+        lines.append(f"Allergies (never use): {', '.join(constraints.allergies)}")
+    if constraints.interactions:
+        lines.append(f"Drug-food interactions: {'; '.join(constraints.interactions)}")
+    if constraints.restrictions:
+        lines.append(f"Dietary restrictions: {', '.join(constraints.restrictions)}")
+    if constraints.other_conditions:
+        lines.append(f"Other conditions (apply their dietary needs): {', '.join(constraints.other_conditions)}")
+    if constraints.other_medications:
+        lines.append(f"Other medications (check food interactions): {', '.join(constraints.other_medications)}")
+    if constraints.goals:
+        lines.append(f"Goals: {', '.join(constraints.goals)}")
+    return "\n".join(lines) or "No medical dietary constraints - use general healthy guidelines"
+
+
+def prompt_tokens(clinical_data: Optional[dict]) -> Tuple[int, int]:
+    # (tokens of the raw JSON profile, tokens of the constraint text). The
+    # constraint text carries derived rules the raw profile lacks, so for a
+    # short profile it can be the longer of the two.
+    raw = dumps(clinical_data or {}).decode("utf-8")
+    return estimate_tokens(raw), estimate_tokens(constraints_prompt(derive_constraints(clinical_data)))
@@ -0,0 +1,209 @@
+import argparse
+import asyncio
+import statistics
+import time
+from collections import deque
+from typing import Optional
+
+from aiohttp import web
+
+import health_report_analyser as analyser
+from incremental_analysis import SectionIndex, incremental_extract
+from lab_archive import ARCHIVE_DIR, archive_extraction
+from request_coalescing import coalescing_stats
+from serialization import dumps, dumps_str, loads
+
+# ================= CONFIG =================
+HOST = "0.0.0.0"
+PORT = 8600
+QUEUE_SIZE = 256           # pending documents before new requests get 429
+MAX_CONCURRENCY = 16       # model calls in flight at once
+MAX_BATCH_REQUEST = 100    # documents accepted in one /extract/batch call
+LATENCY_WINDOW = 1000
+
+
+# ================= SERVICE =================
+class ExtractionService:
+    # Requests enqueue (content, owner, future) items; one dispatcher task hands
+    # each item to a worker thread as soon as a semaphore slot is free. Every
+    # document is still its own model call on the shared, already-warm analyser
+    # client: /extract/batch saves HTTP round trips, not model calls.
+    def __init__(self, queue_size: int = QUEUE_SIZE, max_concurrency: int = MAX_CONCURRENCY,
+                 archive_root: str = ARCHIVE_DIR):
+        self.archive_root = archive_root
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.section_index = SectionIndex()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.started = time.time()
+        self.in_flight = 0
+        self.metrics = {"documents": 0, "rejected": 0, "errors": 0, "archive_errors": 0}
+        self._dispatcher = None
+
+    def _extract(self, content: str, owner: Optional[str]) -> dict:
+        if owner is None:
+            report = analyser.extract_text(content)
+        else:
+            report, stats = incremental_extract(content, owner, analyser.extract_text, self.section_index)
+            if "error" in report:
+                return report
+            report = {**analyser.validate_report(dumps(report)), "_reuse": stats}
+        if "error" not in report:
+            try:
+                archive_extraction(owner or report.get("patient_name"), report, self.archive_root)
+            except Exception:
+                self.metrics["archive_errors"] += 1
+        return report
+
+    async def _run_one(self, content: str, owner: Optional[str], future: asyncio.Future, enqueued: float):
+        # The dispatcher already holds a semaphore slot for this item
+        self.in_flight += 1
+        try:
+            result = await asyncio.to_thread(self._extract, content, owner)
+        except Exception as e:
+            self.metrics["errors"] += 1
+            result = {"error": str(e)}
+        finally:
+            self.in_flight -= 1
+            self.semaphore.release()
+        self.latencies.append(time.perf_counter() - enqueued)
+        if not future.done():
+            future.set_result(result)
+
+    async def _dispatch_loop(self):
+        while True:
+            # Waiting for a slot before taking the next item keeps unstarted
+            # work in the bounded queue, so a saturated service answers 429.
+            await self.semaphore.acquire()
+            item = await self.queue.get()
+            asyncio.create_task(self._run_one(*item))
+            self.queue.task_done()
+
+    def start(self):
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def stop(self):
+        if self._dispatcher:
+            self._dispatcher.cancel()
+
+    def submit_many(self, documents: list) -> Optional[list]:
+        # All-or-nothing admission so a batch is never half-queued
+        if self.queue.maxsize - self.queue.qsize() < len(documents):
+            self.metrics["rejected"] += len(documents)
+            return None
+        loop = asyncio.get_running_loop()
+        futures = []
+        for content, owner in documents:
+            future = loop.create_future()
+            self.queue.put_nowait((content, owner, future, time.perf_counter()))
+            futures.append(future)
+        self.metrics["documents"] += len(documents)
+        return futures
+
+    def snapshot(self) -> dict:
+        latencies = sorted(self.latencies)
+        percentiles = {}
+        if len(latencies) >= 2:
+            cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+            percentiles = {"p50_ms": round(cuts[49] * 1000, 1), "p95_ms": round(cuts[94] * 1000, 1),
+                           "p99_ms": round(cuts[98] * 1000, 1)}
+        return {
+            **self.metrics,
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "in_flight": self.in_flight,
+            "latency": percentiles,
+            "uptime_s": round(time.time() - self.started, 1),
+            "coalescing": coalescing_stats(),
+            "routing": analyser.get_client().snapshot(),
+        }
+
+
+# ================= HTTP =================
+async def _json_body(request: web.Request) -> Optional[dict]:
+    try:
+        body = loads(await request.read())
+    except ValueError:
+        return None
+    return body if isinstance(body, dict) else None
+
+
+def _too_busy() -> web.Response:
+    return web.json_response({"error": "Extraction queue is full, retry shortly."}, status=429,
+                             headers={"Retry-After": "2"})
+
+
+async def handle_extract(request: web.Request) -> web.Response:
+    service = request.app["service"]
+    body = await _json_body(request) or {}
+    content = body.get("content")
+    if not isinstance(content, str) or not content.strip():
+        return web.json_response({"error": "'content' must be a non-empty string"}, status=400)
+    futures = service.submit_many([(content, body.get("owner"))])
+    if futures is None:
+        return _too_busy()
+    return web.json_response(await futures[0], dumps=_dumps)
+
+
+async def handle_extract_batch(request: web.Request) -> web.Response:
+    service = request.app["service"]
+    body = await _json_body(request) or {}
+    documents = body.get("documents")
+    if not isinstance(documents, list) or not documents:
+        return web.json_response({"error": "'documents' must be a non-empty list"}, status=400)
+    if len(documents) > MAX_BATCH_REQUEST:
+        return web.json_response({"error": f"At most {MAX_BATCH_REQUEST} documents per request"}, status=413)
+    if any(not isinstance(d, dict) or not isinstance(d.get("content"), str) for d in documents):
+        return web.json_response({"error": "Each document needs a 'content' string"}, status=400)
+
+    futures = service.submit_many([(d["content"], d.get("owner")) for d in documents])
+    if futures is None:
+        return _too_busy()
+    results = await asyncio.gather(*futures)
+    return web.json_response(
+        {"results": [{"key": d.get("key", i), "report": r} for i, (d, r) in enumerate(zip(documents, results))]},
+        dumps=_dumps,
+    )
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    service = request.app["service"]
+    full = service.queue.full()
+    return web.json_response({"status": "degraded" if full else "ok", "queue_depth": service.queue.qsize()},
+                             status=503 if full else 200)
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.json_response(request.app["service"].snapshot(), dumps=_dumps)
+
+
+def _dumps(data) -> str:
+    return dumps_str(data)
+
+
+def create_app(service: Optional[ExtractionService] = None) -> web.Application:
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+
+    async def on_startup(app):
+        app["service"] = service or ExtractionService()
+        app["service"].start()
+
+    async def on_cleanup(app):
+        await app["service"].stop()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    app.router.add_post("/extract", handle_extract)
+    app.router.add_post("/extract/batch", handle_extract_batch)
+    app.router.add_get("/health", handle_health)
+    app.router.add_get("/metrics", handle_metrics)
+    return app
+
+
+# ================= MAIN =================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Async HTTP service around the report extraction core")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+    web.run_app(create_app(), host=args.host, port=args.port)
@@ -1,51 +1,43 @@
-from google import genai
-from google.genai.errors import ClientError
 import os
-import json
-import time
-from typing import List, Optional
-from pydantic import BaseModel
-import enum
+import threading
+from typing import Optional, Tuple
+
+from helios_core import create_client, read_document
+from request_coalescing import coalesced_generate
+from model_router import MODEL_TIERS
+from incremental_analysis import SectionIndex, incremental_extract
+from result_log import ResultLog, RESULT_LOG
+from medical_models import DocType, LabResult, Medication, MedicalReport  # re-exported for existing importers
+from serialization import dumps, loads, parse_report, report_dict
+from reference_ranges import flag_lab_results
+from sampling_profiler import profile_request
 
 # ================= CONFIG =================
-API_KEY = "INSERT API key"   # 🔴 must have quota/billing
-MODEL_NAME = "gemini-3-flash-preview"  # safer than 2.0
-OUTPUT_FILE = "medical_report.json"
-
-client = genai.Client(api_key=API_KEY)
-
-# ================= DATA MODELS =================
-class DocType(str, enum.Enum):
-    LAB = "LAB_REPORT"
-    RX = "PRESCRIPTION"
-    NOTE = "CLINICAL_NOTE"
-    OTHER = "OTHER"
-
-class LabResult(BaseModel):
-    test_name: Optional[str] = None
-    value: Optional[str] = None
-    unit: Optional[str] = None
-    is_abnormal: Optional[bool] = None
-
-class Medication(BaseModel):
-    name: Optional[str] = None
-    dosage: Optional[str] = None
-    frequency: Optional[str] = None
-
-class MedicalReport(BaseModel):
-    report_type: Optional[DocType] = None
-    patient_name: Optional[str] = None
-    date: Optional[str] = None
-    lab_results: Optional[List[LabResult]] = None
-    medications: Optional[List[Medication]] = None
-    clinical_summary: Optional[str] = None
+API_KEY = os.environ.get("GEMINI_API_KEY", "INSERT API key")   # 🔴 must have quota/billing
+MODEL_NAME = MODEL_TIERS[0]  # preferred tier; see model_router.MODEL_TIERS
+OUTPUT_FILE = RESULT_LOG  # append-only JSONL + .idx sidecar, see result_log.py
+
+# Built on first call, not at import: importing google-genai and opening the
+# client would otherwise be paid by every importer (service, batch, CLI).
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = create_client(API_KEY)
+        return _client
 
 # ================= GEMINI CALL (SAFE) =================
 def call_gemini(prompt: str, content: str):
+    from google.genai.errors import ClientError
+
     try:
-        return client.models.generate_content(
-            model=MODEL_NAME,
-            contents=[prompt, content],
+        return coalesced_generate(
+            get_client(),
+            MODEL_NAME,
+            [prompt, content],
             config={"temperature": 0.1}
         )
     except ClientError as e:
@@ -58,11 +50,7 @@ def call_gemini(prompt: str, content: str):
             raise e
 
 # ================= PARSER =================
-def parse_document(file_path: str) -> dict:
-    with open(file_path, "r", encoding="utf-8") as f:
-        content = f.read()
-
-    prompt = """
+EXTRACTION_PROMPT = """
     Extract medical information and return STRICT JSON ONLY.
     Use null for missing values.
 
@@ -81,28 +69,64 @@ def parse_document(file_path: str) -> dict:
     }
     """
 
-    response = call_gemini(prompt, content)
-    if response is None:
-        return {"error": "Quota exceeded. No API call made."}
-
-    raw = response.text.strip()
+def check_report(raw: str) -> Tuple[dict, bool]:
+    # (report, passed MedicalReport validation)
+    raw = raw.strip()
 
     # Try validation
     try:
-        report = MedicalReport.model_validate_json(raw)
-        return report.model_dump()
+        # is_abnormal comes from the local reference table where it knows the marker
+        return flag_lab_results(report_dict(parse_report(raw))), True
     except Exception:
-        # Fallback: save raw JSON
+        # Fallback: save raw JSON, still flagged by the local table
         try:
-            return json.loads(raw)
+            data = loads(raw)
         except Exception:
-            return {"error": "Invalid JSON returned by model"}
+            data = None
+        if not isinstance(data, dict):
+            return {"error": "Invalid JSON returned by model"}, False
+        return flag_lab_results(data), False
+
+def validate_report(raw: str) -> dict:
+    return check_report(raw)[0]
+
+def extract_text(content: str) -> dict:
+    response = call_gemini(EXTRACTION_PROMPT, content)
+    if response is None:
+        return {"error": "Quota exceeded. No API call made."}
+
+    return validate_report(response.text)
+
+def parse_document(file_path: str, owner: Optional[str] = None, profile: Optional[str] = None) -> dict:
+    # profile: "auto" | "always" | "off"; defaults to the HELIOS_PROFILE env var
+    with profile_request("parse_document", profile) as prof:
+        data = _parse_document(file_path, owner)
+    if prof.path:
+        print(f"⏱️ Profile ({prof.elapsed:.1f}s, {prof.samples} samples) written to {prof.path}")
+    return data
+
+def _parse_document(file_path: str, owner: Optional[str]) -> dict:
+    content = read_document(file_path)
+
+    if owner is None:
+        return extract_text(content)
+
+    # Only sections not seen in this owner's earlier reports go to the model
+    report, stats = incremental_extract(content, owner, extract_text, SectionIndex())
+    if "error" in report:
+        return report
+    print(f"♻️ Reused {stats['reused']}/{stats['sections']} sections "
+          f"({stats['skipped_fraction']:.0%} of text skipped)")
+    return validate_report(dumps(report))
 
 # ================= SAVE JSON =================
 def save_json(data: dict):
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
-    print(f"\n✅ JSON saved to {OUTPUT_FILE}")
+    log = ResultLog(OUTPUT_FILE)
+    try:
+        log.append(data)
+    finally:
+        log.close()
+    print(f"\n✅ JSON appended to {OUTPUT_FILE} ({len(log)} records)")
 
 # ================= MAIN =================
 if __name__ == "__main__":
@@ -112,5 +136,8 @@ if __name__ == "__main__":
         print("❌ Input file not found")
         exit()
 
-    data = parse_document(target_file)
+    data = parse_document(target_file, owner="default")
     save_json(data)
+    if "error" not in data:
+        from lab_archive import archive_extraction
+        archive_extraction(data.get("patient_name"), data)
@@ -0,0 +1,183 @@
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+import helios_core
+from sampling_profiler import PROFILE_MODES, profile_request
+
+# Everything beyond helios_core (genai, pydantic, pyarrow, PIL) is imported
+# inside the command that needs it; `startup` checks this stays true.
+
+# ================= CONFIG =================
+# Cold-start budget for `helios_cli.py --help`, measured on top of a bare
+# interpreter start so the number tracks our imports, not the machine.
+STARTUP_BUDGET_MS = 60
+STARTUP_RUNS = 7
+HEAVY_MODULES = ("streamlit", "pandas", "PIL", "pyarrow", "google.genai", "pydantic")
+
+
+# ================= COMMANDS =================
+def _print_json(data):
+    from serialization import dumps_str
+
+    print(dumps_str(data, indent=True))
+
+
+def _load_profile(path: str) -> dict:
+    from serialization import loads
+
+    with open(path, "rb") as f:
+        data = loads(f.read())
+    # Accept a bare profile, a history entry ({"data": ...}) or a list of entries
+    if isinstance(data, list):
+        data = data[-1] if data else {}
+    return data.get("data", data) if isinstance(data, dict) else {}
+
+
+def cmd_extract(args) -> int:
+    with profile_request("extract", args.profile) as prof:
+        content = helios_core.read_document(args.file)
+        if not content.strip():
+            print("❌ Could not extract text from the file.", file=sys.stderr)
+            return 1
+        client = helios_core.create_client()
+        extract = lambda text: helios_core.extract_profile(client, args.model, text)
+        if args.owner:
+            from incremental_analysis import SectionIndex, incremental_extract
+
+            profile, reuse = incremental_extract(content, args.owner, extract, SectionIndex())
+            print(f"♻️ Reused {reuse['reused']}/{reuse['sections']} sections", file=sys.stderr)
+        else:
+            profile = extract(content)
+    if prof.path:
+        print(f"⏱️ Profile written to {prof.path}", file=sys.stderr)
+    _print_json(profile)
+    return 0
+
+
+def cmd_report(args) -> int:
+    import health_report_analyser as analyser
+
+    data = analyser.parse_document(args.file, owner=args.owner, profile=args.profile)
+    if args.save:
+        analyser.save_json(data)
+    _print_json(data)
+    return 1 if "error" in data else 0
+
+
+def cmd_constraints(args) -> int:
+    from dietary_profile import constraints_prompt, derive_constraints, prompt_tokens
+
+    profile = _load_profile(args.profile)
+    print(constraints_prompt(derive_constraints(profile)))
+    raw_tokens, compact_tokens = prompt_tokens(profile)
+    print(f"\n~{compact_tokens} prompt tokens (raw profile ~{raw_tokens})", file=sys.stderr)
+    return 0
+
+
+def cmd_recipes(args) -> int:
+    from PIL import Image
+
+    from dietary_profile import constraints_prompt, derive_constraints
+    from request_coalescing import coalesced_generate
+    from serialization import dumps_str
+
+    constraints = constraints_prompt(derive_constraints(_load_profile(args.profile)))
+    images = [Image.open(path) for path in args.images]
+    client = helios_core.create_client()
+    # Pages of --page-size are printed as they arrive, each excluding earlier names
+    recipes = []
+    while len(recipes) < args.count:
+        shown = [r["name"] for r in recipes]
+        prompt = helios_core.recipe_prompt(constraints, min(args.page_size, args.count - len(recipes)),
+                                           args.meal, args.time, args.cuisine, exclude=shown)
+        response = coalesced_generate(client, args.model, [prompt] + images, helios_core.RECIPE_CONFIG)
+        page = helios_core.parse_recipes(response.text, exclude=shown)
+        if not page:
+            break
+        recipes.extend(page)
+        if args.json:
+            for recipe in page:
+                print(dumps_str(recipe))
+        else:
+            print("\n\n".join(helios_core.recipe_markdown(r) for r in page), end="\n\n", flush=True)
+    return 0 if recipes else 1
+
+
+def _wall_ms(argv: list) -> float:
+    start = time.perf_counter()
+    subprocess.run(argv, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return (time.perf_counter() - start) * 1000
+
+
+def cmd_startup(args) -> int:
+    # Median over several runs of (CLI --help) - (bare interpreter)
+    base = statistics.median(_wall_ms([sys.executable, "-c", "pass"]) for _ in range(args.runs))
+    cli = statistics.median(_wall_ms([sys.executable, __file__, "--help"]) for _ in range(args.runs))
+    check = "import sys, helios_cli; print(','.join(m for m in %r if m in sys.modules))" % (HEAVY_MODULES,)
+    leaked = subprocess.run([sys.executable, "-c", check], capture_output=True, text=True, check=True).stdout.strip()
+
+    overhead = cli - base
+    print(f"interpreter {base:.0f} ms, cli --help {cli:.0f} ms, overhead {overhead:.0f} ms "
+          f"(budget {args.budget_ms} ms)")
+    if leaked:
+        print(f"❌ Heavy modules imported at startup: {leaked}")
+        return 1
+    if overhead > args.budget_ms:
+        print("❌ Startup budget exceeded")
+        return 1
+    print("✅ Within startup budget")
+    return 0
+
+
+# ================= MAIN =================
+def build_parser() -> argparse.ArgumentParser:
+    from model_router import MODEL_TIERS
+
+    parser = argparse.ArgumentParser(prog="helios", description="HELIOS health report and recipe tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("extract", help="extract a health profile (conditions, markers, medications) from a report")
+    p.add_argument("file", help=".txt or .pdf report")
+    p.add_argument("--owner", help="reuse unchanged sections from this owner's earlier reports")
+    p.add_argument("--model", default=MODEL_TIERS[0])
+    p.add_argument("--profile", choices=PROFILE_MODES,
+                   help="sample the run and write a collapsed-stack profile (auto: only when slow)")
+    p.set_defaults(func=cmd_extract)
+
+    p = sub.add_parser("report", help="extract a MedicalReport with the analyser schema")
+    p.add_argument("file", help=".txt or .pdf report")
+    p.add_argument("--owner")
+    p.add_argument("--save", action="store_true", help="append the result to the result log")
+    p.add_argument("--profile", choices=PROFILE_MODES,
+                   help="sample the run and write a collapsed-stack profile (auto: only when slow)")
+    p.set_defaults(func=cmd_report)
+
+    p = sub.add_parser("constraints", help="compile a saved profile JSON into dietary constraints")
+    p.add_argument("profile", help="profile JSON (as printed by `extract`)")
+    p.set_defaults(func=cmd_constraints)
+
+    p = sub.add_parser("recipes", help="suggest recipes for a profile from ingredient photos")
+    p.add_argument("profile", help="profile JSON (as printed by `extract`)")
+    p.add_argument("images", nargs="+")
+    p.add_argument("--count", type=int, default=helios_core.RECIPE_PAGE_SIZE, help="total recipes")
+    p.add_argument("--page-size", type=int, default=helios_core.RECIPE_PAGE_SIZE)
+    p.add_argument("--json", action="store_true", help="print one JSON record per line")
+    p.add_argument("--meal", default="Dinner")
+    p.add_argument("--time", default="30 mins")
+    p.add_argument("--cuisine", action="append", help="repeatable")
+    p.add_argument("--model", default=MODEL_TIERS[0])
+    p.set_defaults(func=cmd_recipes)
+
+    p = sub.add_parser("startup", help="measure CLI cold start against the budget")
+    p.add_argument("--runs", type=int, default=STARTUP_RUNS)
+    p.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    p.set_defaults(func=cmd_startup)
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    sys.exit(args.func(args))
@@ -0,0 +1,260 @@
+import io
+import math
+import os
+import re
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# Streamlit-free core shared by the apps, the analyser and helios_cli.py.
+# Only the stdlib is imported at module level: google-genai, pypdf and the
+# serialization layer (pydantic) load inside the functions that need them,
+# so a CLI invocation pays for them only when it actually calls the model.
+
+# ================= CONFIG =================
+API_KEY_ENV = "GEMINI_API_KEY"
+TEXT_EXTENSIONS = (".txt", ".md")
+
+_VALUE_RE = re.compile(r"[-+]?\d*\.\d+|[-+]?\d+")
+_FENCE_RE = re.compile(r"```(?:json)?\s*")
+_OBJECT_RE = re.compile(r"\{[\s\S]*\}")
+
+
+# ================= PROMPTS =================
+# One recipe record as requested from the model; parse_recipes keeps these keys
+_RECIPE_JSON = """        {
+            "name": "creative and appetizing name",
+            "prep_time": "e.g. 25 min",
+            "ingredients": ["ingredients from the images"],
+            "missing_ingredients": ["anything extra to buy"],
+            "medical_benefits": "how it supports their health conditions",
+            "instructions": ["step-by-step, clear"],
+            "chefs_tip": "pro technique or substitution",
+            "nutrition": "key nutrients"
+        }"""
+
+PROFILE_PROMPT = """You are a medical data extraction specialist. Analyze this medical report carefully and extract all relevant clinical information.
+
+Return the data in this EXACT JSON format (no additional text):
+{
+    "conditions": ["list of diagnosed conditions"],
+    "lab_markers": {"marker_name": "value with units"},
+    "medications": ["list of medications"],
+    "allergies": ["list of allergies or food restrictions"],
+    "dietary_restrictions": ["specific dietary needs"],
+    "summary": "Brief 2-3 sentence summary"
+}
+
+Extract ALL lab values with units. If a field has no data, use empty list [] or object {}.
+Analyze this report:"""
+
+
+def kitchen_prompt(constraints: str, dietary: List[str], cuisine: List[str], meal: str,
+                   cooking_time: str, known_products: str = "None") -> Tuple[str, str]:
+    # (prefix, request): the prefix only depends on the health profile; the
+    # request carries the per-scan choices.
+    prefix = f"""Analyze these kitchen images. User dietary constraints (compiled from their health profile):
+{constraints}
+
+Return ONLY this JSON (no additional text):
+{{
+    "detected_ingredients": ["every visible item"],
+    "nutritional_gaps": ["what is missing for their health needs"],
+    "shopping": ["5-7 items, each starting with ESSENTIAL, RECOMMENDED or OPTIONAL"],
+    "recipes": [
+{_RECIPE_JSON}
+    ]
+}}
+Give exactly 3 recipes."""
+    request = f"""Dietary: {", ".join(dietary) or "None"}, Cuisine: {", ".join(cuisine) or "Any"}, Meal: {meal}, Time: {cooking_time}
+Already identified packaged products (do not re-detect): {known_products}"""
+    return prefix, request
+
+
+def recipe_prompt(constraints: str, count: int, meal_type: str, cooking_time: str,
+                  cuisines: Optional[List[str]] = None, exclude: Iterable[str] = ()) -> str:
+    # One page of recipes as JSON records (see RECIPE_FIELDS). `exclude` holds
+    # the names already returned, so "more recipes" asks only for new ones.
+    cuisine_filter = f"\nPreferred cuisines: {', '.join(cuisines)}" if cuisines else ""
+    exclude = list(exclude)
+    exclude_filter = f"\nAlready suggested, do NOT repeat or rename these: {'; '.join(exclude)}" if exclude else ""
+    return f"""
+You are a professional medical nutritionist and chef with expertise in personalized meal planning.
+
+TASK:
+1. Carefully identify ALL ingredients visible in the provided images
+2. Respect the dietary constraints below to avoid contraindications
+3. Suggest {count} HEALTHY {meal_type.lower()} recipes that can be made with these ingredients
+4. Each recipe should take no more than {cooking_time} to prepare{cuisine_filter}{exclude_filter}
+
+DIETARY CONSTRAINTS (compiled from the medical profile):
+{constraints}
+
+Return ONLY this JSON (no additional text):
+{{
+    "recipes": [
+{_RECIPE_JSON}
+    ]
+}}
+"""
+
+
+# ================= RECIPES =================
+RECIPE_PAGE_SIZE = 3
+RECIPE_CONFIG = {"response_mime_type": "application/json"}
+RECIPE_FIELDS = ("name", "prep_time", "ingredients", "missing_ingredients",
+                 "medical_benefits", "instructions", "chefs_tip", "nutrition")
+_RECIPE_LISTS = ("ingredients", "missing_ingredients", "instructions")
+
+
+def parse_recipes(text: str, exclude: Iterable[str] = ()) -> List[dict]:
+    return _recipe_records(clean_json_response(text).get("recipes"), exclude)
+
+
+def _recipe_records(items, exclude: Iterable[str] = ()) -> List[dict]:
+    # Model JSON -> recipe records with every RECIPE_FIELDS key. Unnamed
+    # recipes and names in `exclude` (repeats from earlier pages) are dropped.
+    seen = {name.casefold() for name in exclude}
+    records = []
+    for raw in items if isinstance(items, list) else []:
+        if not isinstance(raw, dict) or not str(raw.get("name") or "").strip():
+            continue
+        record = {}
+        for field in RECIPE_FIELDS:
+            value = raw.get(field)
+            if field in _RECIPE_LISTS:
+                value = [str(v) for v in value] if isinstance(value, list) else [str(value)] if value else []
+            else:
+                value = str(value).strip() if value else ""
+            record[field] = value
+        if record["name"].casefold() in seen:
+            continue
+        seen.add(record["name"].casefold())
+        records.append(record)
+    return records
+
+
+def recipe_markdown(recipe: dict) -> str:
+    lines = [f"### {recipe['name']}"]
+    if recipe.get("prep_time"):
+        lines.append(f"**Preparation Time:** {recipe['prep_time']}")
+    if recipe.get("ingredients"):
+        lines.append("**Ingredients:**\n" + "\n".join(f"- {item}" for item in recipe["ingredients"]))
+    if recipe.get("missing_ingredients"):
+        lines.append("**To Buy:** " + ", ".join(recipe["missing_ingredients"]))
+    if recipe.get("medical_benefits"):
+        lines.append(f"**Medical Benefits:** {recipe['medical_benefits']}")
+    if recipe.get("instructions"):
+        lines.append("**Instructions:**\n" + "\n".join(f"{n}. {step}" for n, step in enumerate(recipe["instructions"], 1)))
+    if recipe.get("chefs_tip"):
+        lines.append(f"**Chef's Tip:** {recipe['chefs_tip']}")
+    if recipe.get("nutrition"):
+        lines.append(f"**Nutritional Highlights:** {recipe['nutrition']}")
+    return "\n\n".join(lines)
+
+
+KITCHEN_SECTIONS = (("detected_ingredients", "Detected Ingredients"),
+                    ("nutritional_gaps", "Nutritional Gap Analysis"),
+                    ("shopping", "Shopping Recommendations"))
+
+
+def parse_kitchen(text: str) -> dict:
+    # Kitchen analysis JSON -> {section: [str]} for KITCHEN_SECTIONS plus
+    # "recipes" as parse_recipes records. Raises ValueError on non-JSON replies.
+    data = clean_json_response(text)
+    analysis = {}
+    for key, _ in KITCHEN_SECTIONS:
+        value = data.get(key)
+        analysis[key] = [str(v) for v in value] if isinstance(value, list) else [str(value)] if value else []
+    analysis["recipes"] = _recipe_records(data.get("recipes"))
+    return analysis
+
+
+def kitchen_markdown(analysis: dict) -> str:
+    return "\n\n".join(f"### {title}\n" + "\n".join(f"- {item}" for item in analysis[key])
+                       for key, title in KITCHEN_SECTIONS if analysis[key])
+
+
+# ================= CLEANING =================
+def clean_json_response(text: str) -> dict:
+    # Strips markdown fences and any chatter around the outermost JSON object.
+    # Raises ValueError (a json.JSONDecodeError) when nothing parses.
+    from serialization import loads
+
+    clean = _FENCE_RE.sub("", text).strip()
+    match = _OBJECT_RE.search(clean)
+    if match:
+        clean = match.group()
+    return loads(clean)
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English prompt text
+    return math.ceil(len(text) / 4)
+
+
+def split_value_unit(raw) -> Tuple[Optional[float], Optional[str]]:
+    # "7.2 %" -> (7.2, "%"), "140 mg/dL" -> (140.0, "mg/dL"), "normal" -> (None, None)
+    text = str(raw)
+    match = _VALUE_RE.search(text)
+    if not match:
+        return None, None
+    unit = text[match.end():].strip() or None
+    return float(match.group()), unit
+
+
+def iter_lab_rows(history: Iterable[dict]) -> Iterator[dict]:
+    # Flattens clinical_history entries into (date, marker, value, unit) rows.
+    # Handles both the Streamlit shape (lab_markers dict) and the analyser
+    # shape (lab_results list of LabResult dicts).
+    for entry in history:
+        date = str(entry.get("timestamp") or entry.get("date") or "")
+        data = entry.get("data", entry) or {}
+
+        for marker, raw in (data.get("lab_markers") or {}).items():
+            value, unit = split_value_unit(raw)
+            if value is not None:
+                yield {"date": date, "marker": marker.lower().strip(), "value": value, "unit": unit}
+
+        for result in data.get("lab_results") or []:
+            value, unit = split_value_unit(result.get("value"))
+            if value is None or not result.get("test_name"):
+                continue
+            yield {
+                "date": date,
+                "marker": result["test_name"].lower().strip(),
+                "value": value,
+                "unit": result.get("unit") or unit,
+            }
+
+
+def document_text(file, is_text: bool) -> str:
+    # file is a binary file-like object (Streamlit UploadedFile or open(..., "rb"))
+    if is_text:
+        return file.read().decode("utf-8")
+    from pypdf import PdfReader
+
+    reader = PdfReader(file)
+    return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+def read_document(path: str) -> str:
+    with open(path, "rb") as f:
+        return document_text(io.BytesIO(f.read()), path.lower().endswith(TEXT_EXTENSIONS))
+
+
+# ================= MODEL =================
+def create_client(api_key: Optional[str] = None):
+    # Router over the genai client; built on first use, never at import time
+    from google import genai
+    from model_router import MODEL_TIERS, ModelRouter, direct_fallback
+
+    api_key = api_key or os.environ.get(API_KEY_ENV)
+    if not api_key:
+        raise RuntimeError(f"{API_KEY_ENV} is not set")
+    raw = genai.Client(api_key=api_key)
+    return ModelRouter(raw, fallback=direct_fallback(raw, MODEL_TIERS[-1]))
+
+
+def extract_profile(client, model: str, content: str) -> dict:
+    from request_coalescing import coalesced_generate
+
+    return clean_json_response(coalesced_generate(client, model, [PROFILE_PROMPT, content]).text)
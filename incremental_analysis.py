@@ -0,0 +1,219 @@
+import hashlib
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Tuple
+
+from serialization import dumps, loads
+
+try:
+    import fcntl
+except ImportError:  # Windows: writes still merge, but without a cross-process lock
+    fcntl = None
+
+# ================= CONFIG =================
+SECTION_INDEX_FILE = "section_index.json"
+SHINGLE_WORDS = 5          # words per shingle
+SKETCH_SIZE = 64           # bottom-k shingle hashes kept per section
+SIMILARITY_THRESHOLD = 0.9 # estimated Jaccard reported as a near-duplicate (stats only)
+MAX_SECTIONS_PER_OWNER = 500
+
+# "Chief Complaint:", "MEDICATIONS", "Recent Lab and Diagnostic Results:" ...
+_HEADING_RE = re.compile(r"^\s*(?:[A-Z][A-Za-z0-9 ()/&,-]{2,60}:\s*$|[A-Z][A-Z0-9 ()/&,-]{3,60}\s*$)")
+_WORD_RE = re.compile(r"[a-z0-9.]+")
+_REPORT_FIELDS = ("report_type", "patient_name", "date", "clinical_summary", "summary")
+
+
+# ================= SECTIONS & SHINGLES =================
+def split_sections(text: str) -> List[str]:
+    sections, current = [], []
+    for line in text.splitlines():
+        if _HEADING_RE.match(line) and any(l.strip() for l in current):
+            sections.append("\n".join(current).strip())
+            current = []
+        current.append(line)
+    if any(l.strip() for l in current):
+        sections.append("\n".join(current).strip())
+    return sections
+
+
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def section_hash(text: str) -> str:
+    # Case and whitespace are normalised, everything else (values, "<", ">") counts
+    return hashlib.sha1(" ".join(text.lower().split()).encode("utf-8")).hexdigest()
+
+
+def shingle_sketch(text: str) -> List[int]:
+    words = _words(text)
+    if len(words) < SHINGLE_WORDS:
+        grams = {" ".join(words)}
+    else:
+        grams = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    hashes = {int.from_bytes(hashlib.blake2b(g.encode(), digest_size=8).digest(), "big") for g in grams}
+    return sorted(hashes)[:SKETCH_SIZE]
+
+
+def estimate_similarity(a: List[int], b: List[int]) -> float:
+    # Bottom-k estimate of Jaccard similarity between the two shingle sets
+    if not a or not b:
+        return 0.0
+    union = sorted(set(a) | set(b))[:SKETCH_SIZE]
+    both = set(a) & set(b)
+    return sum(1 for h in union if h in both) / len(union)
+
+
+# ================= SECTION INDEX =================
+@contextmanager
+def _file_lock(path: str):
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+class SectionIndex:
+    # Per-owner record of previously analysed sections and the items that were
+    # extracted from them, persisted as one JSON file. Streamlit, the CLI and
+    # the extraction service each hold their own copy of the same file, so
+    # record() re-reads it under a file lock and merges before writing.
+    def __init__(self, path: str = SECTION_INDEX_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = self._load()
+
+    def _load(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "rb") as f:
+                return loads(f.read())
+        except ValueError:
+            return {}
+
+    def find(self, owner: str, digest: str) -> Optional[dict]:
+        # Exact matches only: a lab section with one changed value is still
+        # >90% similar to the old one, and reusing it would keep the old value
+        with self._lock:
+            for entry in self._data.get(owner, {}).get("sections", []):
+                if entry["hash"] == digest:
+                    return entry
+            return None
+
+    def is_near_duplicate(self, owner: str, sketch: List[int]) -> bool:
+        with self._lock:
+            return any(estimate_similarity(sketch, entry["sketch"]) >= SIMILARITY_THRESHOLD
+                       for entry in self._data.get(owner, {}).get("sections", []))
+
+    def last_fields(self, owner: str) -> dict:
+        with self._lock:
+            return dict(self._data.get(owner, {}).get("fields", {}))
+
+    def record(self, owner: str, new_sections: List[dict], fields: dict):
+        with self._lock, _file_lock(self.path + ".lock"):
+            self._data = self._load()
+            slot = self._data.setdefault(owner, {"sections": [], "fields": {}})
+            known = {entry["hash"] for entry in slot["sections"]}
+            slot["sections"].extend(s for s in new_sections if s["hash"] not in known)
+            slot["sections"] = slot["sections"][-MAX_SECTIONS_PER_OWNER:]
+            slot["fields"].update({k: v for k, v in fields.items() if v is not None})
+            tmp = self.path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(dumps(self._data))
+            os.replace(tmp, self.path)
+
+
+# ================= ATTRIBUTION & MERGE =================
+def _needle(item) -> str:
+    if isinstance(item, dict):
+        item = item.get("test_name") or item.get("name") or ""
+    return str(item).split("(")[0].strip().lower()
+
+
+def _attribute(extracted: dict, section_texts: List[str]) -> Tuple[List[dict], dict]:
+    # Assigns every extracted list element / dict entry to the changed section
+    # whose text mentions it, so it can be reused when that section repeats.
+    # Items no section mentions by name ("HbA1c" from "Hemoglobin A1c") are
+    # returned separately: they belong to this report only and are never reused.
+    per_section = [{} for _ in section_texts]
+    unattributed = {}
+    lowered = [t.lower() for t in section_texts]
+
+    def slot(needle: str) -> dict:
+        for i, text in enumerate(lowered):
+            if needle and needle in text:
+                return per_section[i]
+        return unattributed
+
+    for key, value in extracted.items():
+        if isinstance(value, list):
+            for item in value:
+                slot(_needle(item)).setdefault(key, []).append(item)
+        elif isinstance(value, dict):
+            for name, item in value.items():
+                slot(name.lower()).setdefault(key, {})[name] = item
+    return per_section, unattributed
+
+
+def _merge_items(target: dict, items: dict):
+    for key, value in items.items():
+        if isinstance(value, list):
+            existing = target.setdefault(key, [])
+            seen = {dumps(v, sort_keys=True) for v in existing}
+            existing.extend(v for v in value if dumps(v, sort_keys=True) not in seen)
+        elif isinstance(value, dict):
+            target.setdefault(key, {}).update(value)
+
+
+# ================= INCREMENTAL EXTRACTION =================
+def incremental_extract(content: str, owner: str, extract_fn: Callable[[str], dict],
+                        index: SectionIndex) -> Tuple[dict, dict]:
+    # Runs extract_fn only over sections not seen verbatim in this owner's
+    # earlier reports, then merges in the items previously extracted from the
+    # rest. Near-duplicates (e.g. the same lab panel with new values) are sent
+    # again and only counted in the stats.
+    sections = split_sections(content) or [content]
+    reused, changed = [], []
+    near_duplicates = 0
+    for text in sections:
+        digest = section_hash(text)
+        match = index.find(owner, digest)
+        if match is not None:
+            reused.append(match)
+        else:
+            sketch = shingle_sketch(text)
+            near_duplicates += index.is_near_duplicate(owner, sketch)
+            changed.append({"text": text, "hash": digest, "sketch": sketch})
+
+    merged = {}
+    for entry in reused:
+        _merge_items(merged, entry["items"])
+
+    fields = index.last_fields(owner)
+    if changed:
+        extracted = extract_fn("\n\n".join(s["text"] for s in changed))
+        if "error" in extracted:
+            return extracted, {"sections": len(sections), "reused": len(reused), "skipped_fraction": 0.0}
+        per_section, unattributed = _attribute(extracted, [s["text"] for s in changed])
+        for section, items in zip(changed, per_section):
+            section["items"] = items
+            _merge_items(merged, items)
+        _merge_items(merged, unattributed)
+        fields.update({k: extracted[k] for k in _REPORT_FIELDS if extracted.get(k) is not None})
+        index.record(owner, [{k: v for k, v in s.items() if k != "text"} for s in changed],
+                     {k: extracted.get(k) for k in _REPORT_FIELDS})
+
+    merged.update({k: v for k, v in fields.items() if k not in merged})
+    total_chars = sum(len(t) for t in sections) or 1
+    changed_chars = sum(len(s["text"]) for s in changed)
+    stats = {
+        "sections": len(sections),
+        "reused": len(reused),
+        "sent": len(changed),
+        "near_duplicates": near_duplicates,
+        "skipped_fraction": round(1 - changed_chars / total_chars, 3),
+    }
+    return merged, stats
@@ -0,0 +1,223 @@
+import os
+import re
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from helios_core import iter_lab_rows
+from reference_ranges import CANONICAL_UNITS, _convert, canonical_marker, normalize_unit
+
+try:
+    import fcntl
+except ImportError:  # Windows: compactions are not coordinated across processes
+    fcntl = None
+
+# ================= CONFIG =================
+ARCHIVE_DIR = "lab_archive"
+COMPACT_MIN_FILES = 16     # part files in one partition before it is merged
+
+# Rows are partitioned on disk as lab_archive/month=YYYY-MM/marker=<slug>/part-*.parquet,
+# so filters on month/marker prune whole directories before any file is opened.
+# Markers the reference table knows ("HbA1c", "Hemoglobin A1c", "Glycated
+# hemoglobin") share one partition, with values converted to its canonical unit.
+PARTITIONING = ds.partitioning(
+    pa.schema([("month", pa.string()), ("marker", pa.string())]),
+    flavor="hive",
+)
+
+ARCHIVE_SCHEMA = pa.schema([
+    ("user", pa.string()),
+    ("date", pa.string()),
+    ("marker_label", pa.string()),
+    ("value", pa.float64()),
+    ("unit", pa.string()),
+    ("ingested_at", pa.timestamp("s")),
+    ("month", pa.string()),
+    ("marker", pa.string()),
+])
+
+_MONTH_RE = re.compile(r"^(\d{4})-(\d{2})")
+
+
+# ================= HELPERS =================
+def marker_slug(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_") or "unknown"
+
+
+def archive_marker(name: str) -> str:
+    # Partition name for a marker label, as used by archive_extraction and queries
+    return marker_slug(canonical_marker(name) or name)
+
+
+def _canonical_reading(label: str, value: float, unit: Optional[str]):
+    # (partition, value, unit). Readings the table cannot convert (creatinine
+    # clearance in mL/min) keep their own label and unit.
+    marker = canonical_marker(label)
+    if marker is not None:
+        converted = _convert(marker, value, unit)
+        if converted == converted:
+            return marker_slug(marker), converted, CANONICAL_UNITS[marker]
+    return marker_slug(label), value, normalize_unit(unit)
+
+
+def _month_of(date: str, fallback: datetime) -> str:
+    match = _MONTH_RE.match(date or "")
+    return f"{match.group(1)}-{match.group(2)}" if match else fallback.strftime("%Y-%m")
+
+
+@contextmanager
+def _compaction_lock(root: str):
+    # Non-blocking: a caller that finds another compaction running skips its own
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, "_compact.lock"), "a") as f:  # "_" files are not data
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+        yield True
+
+
+# ================= INGEST =================
+def archive_extraction(user: Optional[str], entry: dict, root: str = ARCHIVE_DIR,
+                       compact_min_files: int = COMPACT_MIN_FILES) -> int:
+    # Appends the numeric lab readings of one extraction as new uniquely-named
+    # part files, then merges any partition it touched that has reached
+    # compact_min_files, so per-upload ingest does not pile up small files.
+    now = datetime.now().replace(microsecond=0)
+    rows = []
+    for row in iter_lab_rows([entry]):
+        marker, value, unit = _canonical_reading(row["marker"], row["value"], row["unit"])
+        rows.append({
+            "user": user,
+            "date": row["date"],
+            "marker_label": row["marker"],
+            "value": value,
+            "unit": unit,
+            "ingested_at": now,
+            "month": _month_of(row["date"], now),
+            "marker": marker,
+        })
+    if not rows:
+        return 0
+
+    ds.write_dataset(
+        pa.Table.from_pylist(rows, schema=ARCHIVE_SCHEMA),
+        root,
+        format="parquet",
+        partitioning=PARTITIONING,
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    touched = {os.path.join(root, f"month={r['month']}", f"marker={r['marker']}") for r in rows}
+    compact(root, compact_min_files, partitions=touched)
+    return len(rows)
+
+
+def _part_files(directory: str) -> List[str]:
+    return [os.path.join(directory, n) for n in os.listdir(directory)
+            if n.endswith(".parquet") and not n.startswith(("_", "."))]
+
+
+def compact(root: str = ARCHIVE_DIR, min_files: int = COMPACT_MIN_FILES,
+            partitions: Optional[Iterable[str]] = None) -> int:
+    # Merges partitions that have accumulated many small part files into one.
+    # `partitions` limits the check to those directories (the ingest path);
+    # by default every partition is checked.
+    with _compaction_lock(root) as locked:
+        if not locked:
+            return 0
+        if partitions is None:
+            partitions = {os.path.dirname(path) for path in open_archive(root).files}
+        merged = 0
+        for directory in partitions:
+            files = _part_files(directory) if os.path.isdir(directory) else []
+            if len(files) < min_files:
+                continue
+            table = ds.dataset(files, format="parquet").to_table()
+            name = f"part-{uuid.uuid4().hex}-compacted.parquet"
+            tmp = os.path.join(directory, f"_{name}")  # "_" prefix is skipped by dataset discovery
+            pq.write_table(table, tmp)
+            os.replace(tmp, os.path.join(directory, name))
+            for path in files:
+                os.remove(path)
+            merged += 1
+        return merged
+
+
+# ================= QUERY =================
+def open_archive(root: str = ARCHIVE_DIR) -> ds.Dataset:
+    return ds.dataset(root, format="parquet", partitioning=PARTITIONING, schema=ARCHIVE_SCHEMA)
+
+
+def build_filter(markers: Optional[Iterable[str]] = None,
+                 start_month: Optional[str] = None,
+                 end_month: Optional[str] = None,
+                 users: Optional[Iterable[str]] = None,
+                 min_value: Optional[float] = None,
+                 max_value: Optional[float] = None):
+    clauses = []
+    if markers:
+        clauses.append(ds.field("marker").isin([archive_marker(m) for m in markers]))
+    if start_month:
+        clauses.append(ds.field("month") >= start_month)
+    if end_month:
+        clauses.append(ds.field("month") <= end_month)
+    if users:
+        clauses.append(ds.field("user").isin(list(users)))
+    if min_value is not None:
+        clauses.append(ds.field("value") >= min_value)
+    if max_value is not None:
+        clauses.append(ds.field("value") <= max_value)
+
+    expr = None
+    for clause in clauses:
+        expr = clause if expr is None else expr & clause
+    return expr
+
+
+def query(columns: Optional[List[str]] = None, root: str = ARCHIVE_DIR, **filters) -> pa.Table:
+    # Projection and predicates are pushed into the scan: partition filters skip
+    # directories, value/user filters use Parquet row-group statistics.
+    return open_archive(root).to_table(columns=columns, filter=build_filter(**filters))
+
+
+def marker_distribution(marker: str,
+                        start_month: Optional[str] = None,
+                        end_month: Optional[str] = None,
+                        quantiles=(0.05, 0.25, 0.5, 0.75, 0.95),
+                        root: str = ARCHIVE_DIR) -> dict:
+    # e.g. marker_distribution("HbA1c", "2024-07", "2024-09"). Statistics cover
+    # one unit only: the canonical one for known markers, otherwise the most
+    # common; readings in other units are counted in "skipped".
+    table = query(["value", "unit"], root=root, markers=[marker], start_month=start_month, end_month=end_month)
+    name = archive_marker(marker)
+    if table.num_rows == 0:
+        return {"marker": name, "count": 0}
+    canonical = canonical_marker(marker)
+    unit = CANONICAL_UNITS.get(canonical)
+    if unit is None:
+        counts = pc.value_counts(table.column("unit")).to_pylist()
+        unit = max(counts, key=lambda c: c["counts"])["values"]
+    same_unit = pc.is_null(table.column("unit")) if unit is None else pc.equal(table.column("unit"), unit)
+    values = table.column("value").filter(same_unit)
+    if len(values) == 0:
+        return {"marker": name, "unit": unit, "count": 0, "skipped": table.num_rows}
+    qs = pc.quantile(values, q=list(quantiles)).to_pylist()
+    return {
+        "marker": name,
+        "unit": unit,
+        "count": len(values),
+        "skipped": table.num_rows - len(values),
+        "mean": pc.mean(values).as_py(),
+        "min": pc.min(values).as_py(),
+        "max": pc.max(values).as_py(),
+        "quantiles": dict(zip(quantiles, qs)),
+    }
@@ -0,0 +1,301 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import psutil
+from google import genai
+from PIL import Image
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit import config as streamlit_config
+from streamlit.runtime import Runtime
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1 import app_test as app_test_module
+from streamlit.testing.v1.util import build_mock_config_get_option
+
+# ================= CONFIG =================
+APP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Model.py")
+SAMPLE_REPORT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "target_file.txt")
+PASSWORD = "loadtest"
+ACTIONS = ["login", "report_upload", "report_analysis", "kitchen_scan", "trends"]
+
+FAKE_EXTRACTION = {
+    "conditions": ["Anxiety", "GERD"],
+    "lab_markers": {"Heart rate": "82 bpm", "BMI": "23.4", "Ejection fraction": "60 %"},
+    "medications": ["Lorazepam 0.5 mg", "Omeprazole 20 mg"],
+    "summary": "Panic-like episodes with normal cardiac workup.",
+}
+FAKE_KITCHEN = {
+    "detected_ingredients": ["spinach", "eggs"],
+    "nutritional_gaps": ["omega-3"],
+    "shopping": ["ESSENTIAL: salmon"],
+    "recipes": [{"name": "Spinach omelette", "prep_time": "10 min", "ingredients": ["spinach", "eggs"],
+                 "instructions": ["Whisk", "Cook"]}],
+}
+
+
+# ================= FAKE MODEL CLIENT =================
+# Replaces genai.Client for the whole process so the app under test never
+# leaves the machine; latency is drawn uniformly from latency * (1 +/- jitter).
+class FakeModels:
+    def __init__(self, latency: float, jitter: float):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, model=None, contents=None, config=None):
+        with self._lock:
+            self.calls += 1
+        time.sleep(max(0.0, random.uniform(self.latency * (1 - self.jitter), self.latency * (1 + self.jitter))))
+        prompt = str(contents[0]) if contents else ""
+        text = json.dumps(FAKE_KITCHEN if '"recipes"' in prompt else FAKE_EXTRACTION)
+        return SimpleNamespace(text=text)
+
+
+class FakeClient:
+    models = None
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+def install_fake_client(latency: float, jitter: float) -> FakeModels:
+    models = FakeModels(latency, jitter)
+    FakeClient.models = models
+    genai.Client = FakeClient
+    return models
+
+
+# Every AppTest has its own ScriptCache and compiles Model.py on first run;
+# concurrent ast.parse calls are not thread-safe on CPython 3.11, so
+# compilation is serialized across sessions.
+_compile_lock = threading.Lock()
+_get_bytecode = ScriptCache.get_bytecode
+
+
+def _locked_get_bytecode(self, script_path):
+    with _compile_lock:
+        return _get_bytecode(self, script_path)
+
+
+ScriptCache.get_bytecode = _locked_get_bytecode
+
+
+# AppTest.run() patches config.get_option for "global.appTest" and restores it
+# on exit. Overlapping runs restore each other's patch, so widgets in a session
+# still running lose their test metadata. Patch it once for the whole process.
+_app_test_option = build_mock_config_get_option({"global.appTest": True})
+streamlit_config.get_option = _app_test_option
+app_test_module.patch_config_options = lambda overrides: contextlib.nullcontext()
+
+# Each AppTest.run() installs a mock Runtime singleton and clears it when done,
+# which pulls it out from under sessions still running (blank pages, missing
+# widgets). All the mocks are interchangeable in-memory ones, so keep serving
+# the most recent one instead of failing.
+_last_runtime = []
+
+
+def _shared_runtime(cls):
+    if cls._instance is not None:
+        _last_runtime[:] = [cls._instance]
+        return cls._instance
+    if _last_runtime:
+        return _last_runtime[0]
+    raise RuntimeError("Runtime hasn't been created!")
+
+
+Runtime.instance = classmethod(_shared_runtime)
+Runtime.exists = classmethod(lambda cls: cls._instance is not None or bool(_last_runtime))
+
+
+# ================= RESOURCE SAMPLER =================
+class ResourceSampler(threading.Thread):
+    def __init__(self, interval: float):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self._done = threading.Event()
+        self._proc = psutil.Process()
+
+    def run(self):
+        start = time.perf_counter()
+        self._proc.cpu_percent(None)
+        while not self._done.wait(self.interval):
+            self.samples.append({
+                "t": round(time.perf_counter() - start, 2),
+                "cpu_percent": self._proc.cpu_percent(None),
+                "rss_mb": round(self._proc.memory_info().rss / 2**20, 1),
+            })
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+# ================= SIMULATED SESSION =================
+def _click(at: AppTest, label_prefix: str):
+    for button in at.button:
+        if button.label.startswith(label_prefix):
+            return button.click()
+    raise LookupError(f"button not found: {label_prefix}")
+
+
+def _fridge_png() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (320, 240), (random.randint(0, 255), 160, 90)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def run_session(user: str, iterations: int, timeout: float, timings: dict, errors: list):
+    def timed(action, fn):
+        start = time.perf_counter()
+        try:
+            fn()
+            if at.exception:
+                raise RuntimeError(at.exception[0].message)
+        except Exception as e:
+            errors.append({"user": user, "action": action, "error": str(e)})
+            return False
+        timings[action].append(time.perf_counter() - start)
+        return True
+
+    with open(SAMPLE_REPORT, "rb") as f:
+        report = f.read()
+
+    at = AppTest.from_file(APP_FILE, default_timeout=timeout)
+    at.secrets["GEMINI_API_KEY"] = "load-test"
+    at.run()
+
+    def login():
+        at.text_input(key="login_user").input(user)
+        at.text_input(key="login_pass").input(PASSWORD)
+        _click(at, "Login").run()
+
+    if not timed("login", login):
+        return
+
+    for i in range(iterations):
+        timed("report_upload", lambda: at.file_uploader(key="medical_uploader")
+              .set_value((f"report_{i}.txt", report, "text/plain")).run())
+        timed("report_analysis", lambda: _click(at, "Analyze & Extract").run())
+
+        def kitchen_scan():
+            at.file_uploader(key="fridge_uploader").set_value(("fridge.png", _fridge_png(), "image/png")).run()
+            _click(at, "Analyze & Generate").run()
+
+        timed("kitchen_scan", kitchen_scan)
+        timed("trends", lambda: at.selectbox(key="trend_marker_select").select_index(0).run())
+
+
+# ================= REPORT =================
+def _percentiles(samples: list) -> dict:
+    if not samples:
+        return {"count": 0}
+    if len(samples) == 1:
+        p50 = p95 = p99 = samples[0]
+    else:
+        cuts = statistics.quantiles(samples, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    return {
+        "count": len(samples),
+        "p50_ms": round(p50 * 1000, 1),
+        "p95_ms": round(p95 * 1000, 1),
+        "p99_ms": round(p99 * 1000, 1),
+        "max_ms": round(max(samples) * 1000, 1),
+    }
+
+
+def run_load_test(sessions: int, iterations: int, latency: float, jitter: float,
+                  ramp_up: float = 0.0, timeout: float = 60.0, sample_interval: float = 0.5) -> dict:
+    models = install_fake_client(latency, jitter)
+    timings = {action: [] for action in ACTIONS}
+    errors = []
+    users = [f"loaduser{n}" for n in range(sessions)]
+
+    # The app resolves users.json and lab_archive/ relative to the cwd
+    workdir = tempfile.mkdtemp(prefix="helios-load-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    with open("users.json", "w") as f:
+        json.dump({u: PASSWORD for u in users}, f)
+    # AppTest swaps st.secrets per run, which races across concurrent sessions;
+    # a secrets.toml in the cwd gives every session the same fallback.
+    os.makedirs(".streamlit")
+    with open(os.path.join(".streamlit", "secrets.toml"), "w") as f:
+        f.write('GEMINI_API_KEY = "load-test"\n')
+
+    sampler = ResourceSampler(sample_interval)
+    sampler.start()
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=sessions) as pool:
+            futures = {}
+            for n, user in enumerate(users):
+                futures[pool.submit(run_session, user, iterations, timeout, timings, errors)] = user
+                if ramp_up and n < sessions - 1:
+                    time.sleep(ramp_up / sessions)
+        for future, user in futures.items():
+            if future.exception():
+                errors.append({"user": user, "action": "session", "error": str(future.exception())})
+    finally:
+        elapsed = time.perf_counter() - start
+        sampler.stop()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    completed = sum(len(v) for v in timings.values())
+    return {
+        "sessions": sessions,
+        "iterations": iterations,
+        "model_latency_s": latency,
+        "elapsed_s": round(elapsed, 2),
+        "actions_completed": completed,
+        "throughput_actions_per_s": round(completed / elapsed, 2) if elapsed else 0,
+        "model_calls": models.calls,
+        "errors": len(errors),
+        "error_samples": errors[:10],
+        "actions": {action: _percentiles(samples) for action, samples in timings.items()},
+        "resources": sampler.samples,
+    }
+
+
+# ================= MAIN =================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless multi-session load test for Model.py")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=1.5, help="fake model latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.3, help="fractional latency spread")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="seconds to spread session starts over")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-rerun timeout in seconds")
+    parser.add_argument("--sample-interval", type=float, default=0.5)
+    parser.add_argument("--output", default=None, help="write the full JSON report here")
+    args = parser.parse_args()
+
+    result = run_load_test(args.sessions, args.iterations, args.latency, args.jitter,
+                           args.ramp_up, args.timeout, args.sample_interval)
+
+    print(f"\n{result['sessions']} sessions x {result['iterations']} iterations in {result['elapsed_s']}s")
+    print(f"Throughput: {result['throughput_actions_per_s']} actions/s, errors: {result['errors']}")
+    print(f"{'action':<18}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for action, stats in result["actions"].items():
+        if stats["count"]:
+            print(f"{action:<18}{stats['count']:>7}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+    if result["resources"]:
+        print(f"Peak CPU: {max(s['cpu_percent'] for s in result['resources'])}%, "
+              f"peak RSS: {max(s['rss_mb'] for s in result['resources'])} MB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\n✅ Report saved to {args.output}")
@@ -0,0 +1,31 @@
+import enum
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+# ================= DATA MODELS =================
+class DocType(str, enum.Enum):
+    LAB = "LAB_REPORT"
+    RX = "PRESCRIPTION"
+    NOTE = "CLINICAL_NOTE"
+    OTHER = "OTHER"
+
+class LabResult(BaseModel):
+    test_name: Optional[str] = None
+    value: Optional[str] = None
+    unit: Optional[str] = None
+    is_abnormal: Optional[bool] = None
+
+class Medication(BaseModel):
+    name: Optional[str] = None
+    dosage: Optional[str] = None
+    frequency: Optional[str] = None
+
+class MedicalReport(BaseModel):
+    report_type: Optional[DocType] = None
+    patient_name: Optional[str] = None
+    date: Optional[str] = None
+    lab_results: Optional[List[LabResult]] = None
+    medications: Optional[List[Medication]] = None
+    clinical_summary: Optional[str] = None
@@ -0,0 +1,207 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, List, Optional
+
+# ================= CONFIG =================
+# Ordered from preferred to lightest/fastest. Hedges and breaker fallbacks move
+# down this list; the first entry is what MODEL_ID/MODEL_NAME used to hard-code.
+MODEL_TIERS = ["gemini-3-flash-preview", "gemini-2.5-flash", "gemini-2.5-flash-lite"]
+
+WINDOW = 100                 # rolling samples kept per tier
+MIN_SAMPLES = 5              # below this the breaker never trips
+DEFAULT_HEDGE_DELAY = 4.0    # seconds, used until a tier has a p95
+MIN_HEDGE_DELAY = 0.5
+MAX_HEDGE_DELAY = 15.0
+LATENCY_SLO = 20.0           # p95 seconds above which a tier's breaker opens
+ERROR_RATE_SLO = 0.5         # error fraction above which a tier's breaker opens
+COOLDOWN = 30.0              # seconds an open breaker waits before a probe
+
+
+class RouterUnavailable(Exception):
+    pass
+
+
+def direct_fallback(client, model: str) -> Callable:
+    # Last resort once every breaker is open: one unrouted call to `model`,
+    # so a transient SLO breach degrades latency instead of failing requests
+    def call(contents, config=None):
+        kwargs = {"model": model, "contents": contents}
+        if config is not None:
+            kwargs["config"] = config
+        return client.models.generate_content(**kwargs)
+    return call
+
+
+# ================= TIER HEALTH =================
+class TierHealth:
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies = deque(maxlen=WINDOW)
+        self.outcomes = deque(maxlen=WINDOW)   # True = success
+        self.state = "closed"                  # closed | open | half_open
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def error_rate(self) -> float:
+        return (self.outcomes.count(False) / len(self.outcomes)) if self.outcomes else 0.0
+
+    def violates_slo(self) -> bool:
+        if len(self.outcomes) < MIN_SAMPLES:
+            return False
+        p95 = self.p95()
+        return self.error_rate() > ERROR_RATE_SLO or (p95 is not None and p95 > LATENCY_SLO)
+
+
+# ================= ROUTER =================
+class ModelRouter:
+    # Drop-in for genai.Client: router.models.generate_content(model=..., contents=...)
+    # starts at the requested tier (or the first tier), skips tiers whose breaker
+    # is open, and hedges to the next healthy tier when the primary attempt is
+    # slower than that tier's recent p95. A primary that fails before the hedge
+    # delay is retried once on the next healthy tier.
+    def __init__(self, client, tiers: List[str] = None, fallback: Optional[Callable] = None, max_workers: int = 32):
+        self.client = client
+        self.tiers = list(tiers or MODEL_TIERS)
+        self.fallback = fallback
+        self.health = {name: TierHealth(name) for name in self.tiers}
+        self.metrics = {
+            "routed": {name: 0 for name in self.tiers},
+            "hedges_fired": 0,
+            "hedge_wins": 0,
+            "retries": 0,
+            "breaker_opened": 0,   # includes reopens after a failed half-open probe
+            "fallbacks": 0,
+        }
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model-router")
+
+    @property
+    def models(self):
+        return self
+
+    # ---------- breaker ----------
+    def _allow(self, tier: TierHealth) -> bool:
+        if tier.state == "closed":
+            return True
+        if tier.state == "open" and time.monotonic() - tier.opened_at >= COOLDOWN:
+            tier.state = "half_open"
+        if tier.state == "half_open" and not tier.probe_in_flight:
+            tier.probe_in_flight = True
+            return True
+        return False
+
+    def _record(self, name: str, latency: float, ok: bool):
+        with self._lock:
+            tier = self.health[name]
+            tier.outcomes.append(ok)
+            if ok:
+                tier.latencies.append(latency)
+            if tier.state == "half_open":
+                tier.probe_in_flight = False
+                if ok:
+                    tier.state = "closed"
+                    tier.latencies.clear()
+                    tier.outcomes.clear()
+                else:
+                    tier.state, tier.opened_at = "open", time.monotonic()
+                    self.metrics["breaker_opened"] += 1
+            elif tier.state == "closed" and tier.violates_slo():
+                tier.state, tier.opened_at = "open", time.monotonic()
+                self.metrics["breaker_opened"] += 1
+
+    def _pick(self, start: int, exclude: Optional[str] = None) -> Optional[str]:
+        with self._lock:
+            for name in self.tiers[start:]:
+                if name != exclude and self._allow(self.health[name]):
+                    return name
+        return None
+
+    def _hedge_delay(self, name: str) -> float:
+        with self._lock:
+            p95 = self.health[name].p95()
+        if p95 is None:
+            return DEFAULT_HEDGE_DELAY
+        return min(MAX_HEDGE_DELAY, max(MIN_HEDGE_DELAY, p95))
+
+    # ---------- calls ----------
+    def _call(self, name: str, contents, config):
+        start = time.perf_counter()
+        kwargs = {"model": name, "contents": contents}
+        if config is not None:
+            kwargs["config"] = config
+        try:
+            response = self.client.models.generate_content(**kwargs)
+        except Exception:
+            self._record(name, time.perf_counter() - start, False)
+            raise
+        self._record(name, time.perf_counter() - start, True)
+        return response
+
+    def generate_content(self, model: Optional[str] = None, contents=None, config=None):
+        start = self.tiers.index(model) if model in self.tiers else 0
+        primary = self._pick(start)
+        if primary is None:
+            with self._lock:
+                self.metrics["fallbacks"] += 1
+            if self.fallback is not None:
+                return self.fallback(contents, config)
+            raise RouterUnavailable("All model tiers are failing their SLOs; try again shortly.")
+
+        with self._lock:
+            self.metrics["routed"][primary] += 1
+        primary_future = self._pool.submit(self._call, primary, contents, config)
+        done, _ = wait([primary_future], timeout=self._hedge_delay(primary))
+
+        if done:
+            error = primary_future.exception()
+            if error is None:
+                return primary_future.result()
+            # Failed before the hedge delay: one retry on the next healthy tier
+            retry = self._pick(self.tiers.index(primary) + 1) or self._pick(start, exclude=primary)
+            if retry is None:
+                raise error
+            with self._lock:
+                self.metrics["retries"] += 1
+                self.metrics["routed"][retry] += 1
+            return self._call(retry, contents, config)
+
+        hedge = self._pick(self.tiers.index(primary) + 1) or self._pick(start, exclude=primary) or primary
+        with self._lock:
+            self.metrics["hedges_fired"] += 1
+            self.metrics["routed"][hedge] += 1
+        hedge_future = self._pool.submit(self._call, hedge, contents, config)
+
+        # First successful answer wins; the loser keeps running only to feed stats
+        last_error = None
+        pending = {primary_future, hedge_future}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge_future:
+                        with self._lock:
+                            self.metrics["hedge_wins"] += 1
+                    return future.result()
+                last_error = future.exception()
+        raise last_error
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            tiers = {
+                name: {
+                    "state": tier.state,
+                    "p95_s": round(tier.p95(), 3) if tier.p95() is not None else None,
+                    "error_rate": round(tier.error_rate(), 3),
+                    "samples": len(tier.outcomes),
+                }
+                for name, tier in self.health.items()
+            }
+            return {**self.metrics, "routed": dict(self.metrics["routed"]), "tiers": tiers}
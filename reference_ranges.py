@@ -0,0 +1,275 @@
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from helios_core import iter_lab_rows, split_value_unit
+
+# ================= REFERENCE TABLE =================
+# Adult reference intervals in each marker's canonical unit.
+# (marker, unit, sex, age_min, age_max, low, high, critical_low, critical_high)
+# Age bands are [age_min, age_max).
+# sex is "M", "F" or None (any); None bounds mean "no limit on that side".
+# A sex-specific row wins over the any-sex row for the same marker and age.
+
+REFERENCE_RANGES = [
+    ("glucose", "mg/dl", None, 0, 120, 70, 99, 40, 400),
+    ("hba1c", "%", None, 0, 120, 4.0, 5.6, None, 14.0),
+    ("total cholesterol", "mg/dl", None, 0, 120, None, 199, None, None),
+    ("ldl", "mg/dl", None, 0, 120, None, 129, None, None),
+    ("hdl", "mg/dl", None, 0, 120, 40, None, None, None),
+    ("hdl", "mg/dl", "F", 0, 120, 50, None, None, None),
+    ("triglycerides", "mg/dl", None, 0, 120, None, 149, None, 1000),
+    ("creatinine", "mg/dl", None, 0, 120, 0.59, 1.35, None, 10.0),
+    ("creatinine", "mg/dl", "M", 0, 120, 0.74, 1.35, None, 10.0),
+    ("creatinine", "mg/dl", "F", 0, 120, 0.59, 1.04, None, 10.0),
+    ("egfr", "ml/min/1.73m2", None, 0, 120, 60, None, 15, None),
+    ("potassium", "mmol/l", None, 0, 120, 3.5, 5.1, 2.8, 6.2),
+    ("sodium", "mmol/l", None, 0, 120, 135, 145, 120, 160),
+    ("calcium", "mg/dl", None, 0, 120, 8.6, 10.3, 6.5, 13.0),
+    ("hemoglobin", "g/dl", None, 0, 120, 12.0, 17.5, 7.0, 20.0),
+    ("hemoglobin", "g/dl", "M", 0, 120, 13.5, 17.5, 7.0, 20.0),
+    ("hemoglobin", "g/dl", "F", 0, 120, 12.0, 15.5, 7.0, 20.0),
+    ("wbc", "10^3/ul", None, 0, 120, 4.5, 11.0, 2.0, 30.0),
+    ("platelets", "10^3/ul", None, 0, 120, 150, 450, 20, 1000),
+    ("tsh", "miu/l", None, 0, 70, 0.4, 4.0, 0.01, 20.0),
+    ("tsh", "miu/l", None, 70, 120, 0.4, 6.0, 0.01, 20.0),
+    ("vitamin d", "ng/ml", None, 0, 120, 30, 100, 10, 150),
+    ("vitamin b12", "pg/ml", None, 0, 120, 200, 900, None, None),
+    ("ferritin", "ng/ml", None, 0, 120, 11, 336, None, None),
+    ("ferritin", "ng/ml", "M", 0, 120, 24, 336, None, None),
+    ("ferritin", "ng/ml", "F", 0, 120, 11, 307, None, None),
+    ("alt", "u/l", None, 0, 120, 7, 56, None, 1000),
+    ("ast", "u/l", None, 0, 120, 10, 40, None, 1000),
+    ("uric acid", "mg/dl", None, 0, 120, 2.4, 7.0, None, None),
+    ("uric acid", "mg/dl", "M", 0, 120, 3.4, 7.0, None, None),
+    ("uric acid", "mg/dl", "F", 0, 120, 2.4, 6.0, None, None),
+]
+
+# Word prefixes of extracted marker names -> canonical marker. Checked in
+# order, so more specific names come first; None marks names to leave unflagged.
+MARKER_ALIASES = [
+    ("non-hdl", None), ("mean corpuscular", None), ("mch", None), ("urine", None),
+    ("hba1c", "hba1c"), ("a1c", "hba1c"), ("glycated", "hba1c"), ("glycosylated", "hba1c"),
+    ("glucose", "glucose"), ("blood sugar", "glucose"), ("fbs", "glucose"),
+    ("ldl", "ldl"), ("hdl", "hdl"), ("triglyceride", "triglycerides"),
+    ("total cholesterol", "total cholesterol"), ("cholesterol", "total cholesterol"),
+    ("egfr", "egfr"), ("creatinine", "creatinine"),
+    ("potassium", "potassium"), ("sodium", "sodium"), ("calcium", "calcium"),
+    ("hemoglobin", "hemoglobin"), ("haemoglobin", "hemoglobin"), ("hgb", "hemoglobin"),
+    ("white blood", "wbc"), ("wbc", "wbc"), ("leukocyte", "wbc"),
+    ("platelet", "platelets"), ("plt", "platelets"),
+    ("tsh", "tsh"), ("thyroid stimulating", "tsh"),
+    ("vitamin d", "vitamin d"), ("25-oh", "vitamin d"), ("b12", "vitamin b12"), ("cobalamin", "vitamin b12"),
+    ("ferritin", "ferritin"), ("alt", "alt"), ("sgpt", "alt"), ("ast", "ast"), ("sgot", "ast"),
+    ("uric acid", "uric acid"), ("urate", "uric acid"),
+]
+
+# (canonical marker, normalized unit) -> factor into the canonical unit
+UNIT_CONVERSIONS = {
+    ("glucose", "mmol/l"): 18.016,
+    ("total cholesterol", "mmol/l"): 38.67,
+    ("ldl", "mmol/l"): 38.67,
+    ("hdl", "mmol/l"): 38.67,
+    ("triglycerides", "mmol/l"): 88.57,
+    ("creatinine", "umol/l"): 1 / 88.4,
+    ("calcium", "mmol/l"): 4.008,
+    ("hemoglobin", "g/l"): 0.1,
+    ("hba1c", "mmol/mol"): None,   # IFCC units need an affine transform, see _convert
+    ("vitamin d", "nmol/l"): 1 / 2.496,
+    ("vitamin b12", "pmol/l"): 1.355,
+    ("ferritin", "ug/l"): 1.0,
+    ("potassium", "meq/l"): 1.0,
+    ("sodium", "meq/l"): 1.0,
+    ("tsh", "uiu/ml"): 1.0,
+    ("tsh", "mu/l"): 1.0,
+    ("wbc", "10^9/l"): 1.0,
+    ("platelets", "10^9/l"): 1.0,
+    ("egfr", "ml/min"): 1.0,
+}
+
+# Status codes, ordered by severity
+UNKNOWN, NORMAL, LOW, HIGH, CRITICAL_LOW, CRITICAL_HIGH = -1, 0, 1, 2, 3, 4
+STATUS_LABELS = {UNKNOWN: "unknown", NORMAL: "normal", LOW: "low", HIGH: "high",
+                 CRITICAL_LOW: "critical low", CRITICAL_HIGH: "critical high"}
+
+_SEX_CODES = {None: 0, "M": 1, "F": 2}
+_UNIT_SPACE_RE = re.compile(r"\s+")
+_ALIAS_RES = [(re.compile(r"(?<![a-z0-9])" + re.escape(alias)), marker) for alias, marker in MARKER_ALIASES]
+_INF = float("inf")
+
+
+# ================= COMPILED TABLE =================
+MARKERS = sorted({row[0] for row in REFERENCE_RANGES})
+_MARKER_IDS = {name: i for i, name in enumerate(MARKERS)}
+CANONICAL_UNITS = {row[0]: row[1] for row in REFERENCE_RANGES}
+
+_T_MARKER = np.array([_MARKER_IDS[r[0]] for r in REFERENCE_RANGES], dtype=np.int16)
+_T_SEX = np.array([_SEX_CODES[r[2]] for r in REFERENCE_RANGES], dtype=np.int8)
+_T_AGE = np.array([(r[3], r[4]) for r in REFERENCE_RANGES], dtype=np.float64)
+# low, high, critical_low, critical_high with missing bounds opened to +/-inf
+_T_BOUNDS = np.array([
+    (-_INF if r[5] is None else r[5], _INF if r[6] is None else r[6],
+     -_INF if r[7] is None else r[7], _INF if r[8] is None else r[8])
+    for r in REFERENCE_RANGES
+], dtype=np.float64)
+
+
+@lru_cache(maxsize=1024)
+def canonical_marker(name: str) -> Optional[str]:
+    lowered = str(name).lower()
+    for pattern, marker in _ALIAS_RES:
+        if pattern.search(lowered):
+            return marker
+    return None
+
+
+def normalize_unit(unit: Optional[str]) -> Optional[str]:
+    if not unit:
+        return None
+    unit = _UNIT_SPACE_RE.sub("", str(unit).lower()).replace("µ", "u").replace("μ", "u")
+    return unit.replace("mcg", "ug").replace("x10", "10").replace("/mm3", "/ul").replace("k/ul", "10^3/ul")
+
+
+def _convert(marker: str, value: float, unit: Optional[str]) -> float:
+    # Value in the marker's canonical unit, or NaN when the unit is unknown
+    unit = normalize_unit(unit)
+    if unit is None or unit == CANONICAL_UNITS[marker]:
+        return value
+    if (marker, unit) not in UNIT_CONVERSIONS:
+        return float("nan")
+    factor = UNIT_CONVERSIONS[(marker, unit)]
+    if factor is None:  # HbA1c mmol/mol (IFCC) -> % (NGSP)
+        return value * 0.09148 + 2.152
+    return value * factor
+
+
+def rows_for_profile(sex: Optional[str] = None, age: Optional[float] = None) -> np.ndarray:
+    # Table row per marker id for this profile (-1 where no row applies).
+    # Resolved once per profile, so evaluating N readings is a single gather.
+    age = 40.0 if age is None else float(age)
+    applies = ((_T_SEX == 0) | (_T_SEX == _SEX_CODES.get(sex, 0))) & (_T_AGE[:, 0] <= age) & (age < _T_AGE[:, 1])
+    priority = np.where(applies, 1 + (_T_SEX != 0), 0)
+    rows = np.full(len(MARKERS), -1, dtype=np.int64)
+    for i in np.argsort(priority, kind="stable"):
+        if priority[i]:
+            rows[_T_MARKER[i]] = i
+    return rows
+
+
+def evaluate(marker_ids: np.ndarray, values: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    # Vectorized status for readings already converted to canonical units
+    row = np.where(marker_ids >= 0, rows[np.clip(marker_ids, 0, None)], -1)
+    bounds = _T_BOUNDS[np.clip(row, 0, None)]
+    low, high, crit_low, crit_high = bounds.T
+    status = np.select(
+        [values < crit_low, values > crit_high, values < low, values > high],
+        [CRITICAL_LOW, CRITICAL_HIGH, LOW, HIGH],
+        NORMAL,
+    ).astype(np.int8)
+    status[(row < 0) | np.isnan(values)] = UNKNOWN
+    return status
+
+
+def range_label(low: float, high: float) -> str:
+    # NaN means no bound on that side, as returned by HistoryFlags.range_for()
+    if low == low and high == high:
+        return f"{low:g}-{high:g}"
+    if low == low:
+        return f">= {low:g}"
+    if high == high:
+        return f"<= {high:g}"
+    return "no reference range"
+
+
+def _prepare(rows: Iterable[dict]):
+    ids, values, raw = [], [], []
+    for r in rows:
+        marker = canonical_marker(r["marker"])
+        ids.append(_MARKER_IDS[marker] if marker else -1)
+        values.append(_convert(marker, r["value"], r.get("unit")) if marker else float("nan"))
+        raw.append(r)
+    return np.array(ids, dtype=np.int64), np.array(values, dtype=np.float64), raw
+
+
+# ================= SINGLE REPORT =================
+def flag_lab_results(report: dict, sex: Optional[str] = None, age: Optional[float] = None) -> dict:
+    # Overwrites LabResult.is_abnormal wherever a local range applies;
+    # the model's guess is kept only for markers the table does not know.
+    results = [r for r in report.get("lab_results") or [] if isinstance(r, dict)]
+    readings = []
+    for result in results:
+        value, unit = split_value_unit(result.get("value"))
+        readings.append({"marker": result.get("test_name") or "",
+                         "value": float("nan") if value is None else value,
+                         "unit": result.get("unit") or unit})
+    if not readings:
+        return report
+    ids, values, _ = _prepare(readings)
+    status = evaluate(ids, values, rows_for_profile(sex, age))
+    for result, code in zip(results, status):
+        if code != UNKNOWN:
+            result["is_abnormal"] = bool(code != NORMAL)
+    return report
+
+
+# ================= WHOLE HISTORY =================
+class HistoryFlags:
+    # Evaluated readings for one clinical_history, kept as parallel arrays.
+    # update() only evaluates entries appended since the last call; a shorter
+    # history (reports cleared) or a new sex/age resets and re-evaluates all.
+    # `generation` increases on every reset so derived state (RollingTrends)
+    # can tell a rebuilt history from one that merely grew.
+    def __init__(self, sex: Optional[str] = None, age: Optional[float] = None):
+        self.generation = 0
+        self._reset(sex, age)
+
+    def _reset(self, sex: Optional[str], age: Optional[float]):
+        self.generation += 1
+        self.sex = sex
+        self.age = age
+        self._rows = rows_for_profile(sex, age)
+        self._entries = 0
+        self.records: List[dict] = []
+        self.marker_ids = np.empty(0, dtype=np.int64)
+        self.values = np.empty(0, dtype=np.float64)
+        self.status = np.empty(0, dtype=np.int8)
+
+    def update(self, history: list, sex: Optional[str] = None, age: Optional[float] = None) -> "HistoryFlags":
+        if (sex, age) != (self.sex, self.age) or len(history) < self._entries:
+            self._reset(sex, age)
+        if len(history) == self._entries:
+            return self
+        ids, values, records = _prepare(iter_lab_rows(history[self._entries:]))
+        self._entries = len(history)
+        if records:
+            self.records.extend(records)
+            self.marker_ids = np.concatenate([self.marker_ids, ids])
+            self.values = np.concatenate([self.values, values])
+            self.status = np.concatenate([self.status, evaluate(ids, values, self._rows)])
+        return self
+
+    def range_for(self, marker: str):
+        # (low, high) for a marker name under this profile, NaN where open
+        canonical = canonical_marker(marker)
+        row = self._rows[_MARKER_IDS[canonical]] if canonical else -1
+        if row < 0:
+            return float("nan"), float("nan")
+        low, high = _T_BOUNDS[row, :2]
+        return (float(low) if np.isfinite(low) else float("nan"),
+                float(high) if np.isfinite(high) else float("nan"))
+
+    def latest_flags(self) -> List[dict]:
+        # Most recent reading per marker that is outside its range, worst first
+        latest = {}
+        for i, record in enumerate(self.records):
+            latest[record["marker"]] = i
+        flagged = [i for i in latest.values() if self.status[i] > NORMAL]
+        flagged.sort(key=lambda i: -int(self.status[i]))
+        return [{**self.records[i], "status": STATUS_LABELS[int(self.status[i])],
+                 "critical": bool(self.status[i] >= CRITICAL_LOW)} for i in flagged]
+
+    def counts(self) -> Dict[str, int]:
+        codes, counts = np.unique(self.status, return_counts=True)
+        return {STATUS_LABELS[int(c)]: int(n) for c, n in zip(codes, counts)}
@@ -0,0 +1,92 @@
+import hashlib
+import threading
+from concurrent.futures import Future
+from typing import Callable
+
+from serialization import dumps
+
+# ================= CONTENT KEYS =================
+def _part_bytes(part) -> bytes:
+    # Prompt strings, uploaded text and PIL images all hash by content, so the
+    # same sample report uploaded by two users maps to the same key.
+    if isinstance(part, bytes):
+        return part
+    if isinstance(part, str):
+        return part.encode("utf-8")
+    if hasattr(part, "tobytes") and hasattr(part, "size"):  # PIL.Image
+        return f"{part.mode}{part.size}".encode() + part.tobytes()
+    return dumps(part, sort_keys=True)
+
+
+def content_key(model: str, contents: list, config=None) -> str:
+    digest = hashlib.sha256()
+    for part in [model, dumps(config, sort_keys=True), *contents]:
+        data = _part_bytes(part)
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+# ================= SINGLE FLIGHT =================
+class SingleFlight:
+    # Concurrent calls with the same key share one execution: the first caller
+    # (the leader) runs fn, everyone arriving while it is in flight waits on the
+    # same Future and gets its result or exception. Nothing is cached after the
+    # call finishes, so later identical requests call the model again.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.stats = {"calls": 0, "executed": 0, "deduplicated": 0, "errors": 0}
+
+    def do(self, key: str, fn: Callable):
+        with self._lock:
+            self.stats["calls"] += 1
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self.stats["executed"] += 1
+            else:
+                self.stats["deduplicated"] += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                self.stats["errors"] += 1
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._inflight[key]
+        future.set_result(result)
+        return result
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._inflight)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["dedup_ratio"] = round(stats["deduplicated"] / stats["calls"], 3) if stats["calls"] else 0.0
+        return stats
+
+
+_default_flight = SingleFlight()
+
+
+def coalesced_generate(client, model: str, contents: list, config=None, flight: SingleFlight = _default_flight):
+    key = content_key(model, contents, config)
+    kwargs = {"model": model, "contents": contents}
+    if config is not None:
+        kwargs["config"] = config
+    return flight.do(key, lambda: client.models.generate_content(**kwargs))
+
+
+def coalescing_stats(flight: SingleFlight = _default_flight) -> dict:
+    return flight.snapshot()
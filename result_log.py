@@ -0,0 +1,248 @@
+import hashlib
+import os
+import struct
+import threading
+import time
+from typing import Iterator, Optional, Tuple
+
+from serialization import SCHEMA_VERSION, dumps, loads
+
+# ================= CONFIG =================
+RESULT_LOG = "medical_reports.jsonl"
+FSYNC_EVERY = 32           # records per fsync; also flushed on close()
+FSYNC_INTERVAL = 1.0       # seconds, whichever comes first
+COMPACT_CHECK_EVERY = 256  # appends between superseded-record checks
+COMPACT_DEAD_RATIO = 0.5   # compact once half the log is duplicate records
+
+# Sidecar index: one fixed-size header per record pointing into the log.
+#   offset (u64) | length (u32) | key length (u16) | key bytes (utf-8)
+# The key is "patient_name\x1fdate\x1freport_type\x1frecord_id", see record_key().
+_ENTRY = struct.Struct("<QIH")
+_SEP = "\x1f"
+
+
+def record_id(record: dict) -> str:
+    # Batch results carry their source_key; anything else is identified by
+    # content, so only a re-appended identical record counts as a duplicate
+    if record.get("source_key"):
+        return str(record["source_key"])
+    body = {k: v for k, v in record.items() if k != "schema_version"}
+    return hashlib.sha1(dumps(body, sort_keys=True)).hexdigest()[:20]
+
+
+def record_key(record: dict) -> Tuple[str, str, str, str]:
+    report_type = record.get("report_type")
+    report_type = getattr(report_type, "value", report_type)
+    return (str(record.get("patient_name") or "").strip().lower(),
+            str(record.get("date") or "").strip(),
+            str(report_type or "").strip().upper(),
+            record_id(record))
+
+
+# ================= RESULT LOG =================
+class ResultLog:
+    # Append-only JSONL store for extraction results. Records are never
+    # rewritten in place; the .idx sidecar maps (patient, date, type, id) to
+    # byte offsets so lookups and patient range scans seek straight to the
+    # record. Several reports may share a patient/date/type; compaction only
+    # drops re-appended copies of the same record.
+    def __init__(self, path: str = RESULT_LOG):
+        self.path = path
+        self.index_path = path + ".idx"
+        self._lock = threading.Lock()
+        self._index = {}           # key tuple -> list of (offset, length)
+        self._latest = {}          # (patient, date, type) -> newest (offset, length)
+        self._pending = 0
+        self._appends = 0
+        self._last_sync = time.monotonic()
+        self._recover()
+        self._log = open(self.path, "ab")
+        self._idx = open(self.index_path, "ab")
+
+    # ---------- recovery ----------
+    def _recover(self):
+        # Drops a partially written tail left by a crash: first from the log
+        # (anything after the last newline), then index entries pointing past
+        # the valid end. Records missing from the index are re-indexed.
+        if not os.path.exists(self.path):
+            open(self.path, "wb").close()
+        with open(self.path, "rb+") as f:
+            size = f.seek(0, os.SEEK_END)
+            valid = self._valid_end(f, size)
+            if valid != size:
+                f.truncate(valid)
+
+        indexed_end = 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "rb") as f:
+                data = f.read()
+            pos, keep = 0, 0
+            while pos + _ENTRY.size <= len(data):
+                offset, length, klen = _ENTRY.unpack_from(data, pos)
+                end = pos + _ENTRY.size + klen
+                if end > len(data) or offset + length > valid:
+                    break
+                key = tuple(data[pos + _ENTRY.size:end].decode("utf-8").split(_SEP))
+                if len(key) != 4:
+                    # Index written before record ids: rebuild it from the log
+                    self._index, self._latest = {}, {}
+                    indexed_end = keep = 0
+                    break
+                self._add(self._index, self._latest, key, offset, length)
+                indexed_end = max(indexed_end, offset + length)
+                pos = keep = end
+            if keep != len(data):
+                with open(self.index_path, "rb+") as f:
+                    f.truncate(keep)
+
+        if indexed_end < valid:
+            with open(self.path, "rb") as f, open(self.index_path, "ab") as idx:
+                f.seek(indexed_end)
+                offset = indexed_end
+                for line in f:
+                    if line.strip():
+                        self._write_index(idx, record_key(loads(line)), offset, len(line))
+                    offset += len(line)
+
+    @staticmethod
+    def _valid_end(f, size: int) -> int:
+        # Offset just past the last newline-terminated record
+        pos = size
+        while pos > 0:
+            start = max(0, pos - 65536)
+            f.seek(start)
+            cut = f.read(pos - start).rfind(b"\n")
+            if cut >= 0:
+                return start + cut + 1
+            pos = start
+        return 0
+
+    @staticmethod
+    def _add(index: dict, latest: dict, key: tuple, offset: int, length: int):
+        index.setdefault(key, []).append((offset, length))
+        if offset >= latest.get(key[:3], (-1, 0))[0]:
+            latest[key[:3]] = (offset, length)
+
+    def _write_index(self, idx, key: tuple, offset: int, length: int):
+        raw_key = _SEP.join(key).encode("utf-8")
+        idx.write(_ENTRY.pack(offset, length, len(raw_key)) + raw_key)
+        self._add(self._index, self._latest, key, offset, length)
+
+    # ---------- writes ----------
+    def append(self, record: dict) -> int:
+        line = dumps({"schema_version": SCHEMA_VERSION, **record}) + b"\n"
+        with self._lock:
+            offset = self._log.seek(0, os.SEEK_END)
+            self._log.write(line)
+            self._write_index(self._idx, record_key(record), offset, len(line))
+            self._pending += 1
+            if self._pending >= FSYNC_EVERY or time.monotonic() - self._last_sync >= FSYNC_INTERVAL:
+                self._sync()
+            self._appends += 1
+            check = self._appends % COMPACT_CHECK_EVERY == 0
+        if check:
+            self.maybe_compact()
+        return offset
+
+    def _sync(self):
+        # Log before index, so an index entry never points at unsynced data
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._idx.flush()
+        os.fsync(self._idx.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            if self._pending:
+                self._sync()
+
+    def close(self):
+        self.flush()
+        self._log.close()
+        self._idx.close()
+
+    # ---------- reads ----------
+    def _read(self, offset: int, length: int) -> dict:
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return loads(f.read(length))
+
+    def get(self, patient_name: str, date: str, report_type: str) -> Optional[dict]:
+        # Latest record for the patient/date/type
+        key = record_key({"patient_name": patient_name, "date": date, "report_type": report_type})[:3]
+        with self._lock:
+            self._log.flush()
+            location = self._latest.get(key)
+        return self._read(*location) if location else None
+
+    def scan(self, patient_name: Optional[str] = None, start_date: Optional[str] = None,
+             end_date: Optional[str] = None, report_type: Optional[str] = None) -> Iterator[dict]:
+        # Date bounds compare ISO strings; only matching records are read
+        patient = patient_name.strip().lower() if patient_name else None
+        rtype = report_type.strip().upper() if report_type else None
+        with self._lock:
+            self._log.flush()
+            matches = sorted(
+                (key[1], loc)
+                for key, locs in self._index.items()
+                if (patient is None or key[0] == patient)
+                and (rtype is None or key[2] == rtype)
+                and (start_date is None or key[1] >= start_date)
+                and (end_date is None or key[1] <= end_date)
+                for loc in locs
+            )
+        with open(self.path, "rb") as f:
+            for _, (offset, length) in matches:
+                f.seek(offset)
+                yield loads(f.read(length))
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(locs) for locs in self._index.values())
+
+    # ---------- compaction ----------
+    def maybe_compact(self) -> int:
+        with self._lock:
+            total = sum(len(locs) for locs in self._index.values())
+            dead = total - len(self._index)
+        if total and dead / total >= COMPACT_DEAD_RATIO:
+            return self.compact()
+        return 0
+
+    def compact(self, keep_latest_only: bool = True) -> int:
+        # Rewrites the log keeping the newest copy of each record (or every
+        # copy when keep_latest_only is False), then atomically swaps both files.
+        with self._lock:
+            self._sync()
+            survivors = sorted(loc for locs in self._index.values()
+                               for loc in (locs[-1:] if keep_latest_only else locs))
+            tmp_log, tmp_idx = self.path + ".compact", self.index_path + ".compact"
+            new_index, new_latest = {}, {}
+            with open(self.path, "rb") as src, open(tmp_log, "wb") as log, open(tmp_idx, "wb") as idx:
+                for offset, length in survivors:
+                    src.seek(offset)
+                    line = src.read(length)
+                    new_offset = log.tell()
+                    log.write(line)
+                    key = record_key(loads(line))
+                    raw_key = _SEP.join(key).encode("utf-8")
+                    idx.write(_ENTRY.pack(new_offset, length, len(raw_key)) + raw_key)
+                    self._add(new_index, new_latest, key, new_offset, length)
+                log.flush()
+                os.fsync(log.fileno())
+                idx.flush()
+                os.fsync(idx.fileno())
+            dropped = sum(len(v) for v in self._index.values()) - len(survivors)
+            self._log.close()
+            self._idx.close()
+            # Remove the old index before swapping the log: a crash in between
+            # leaves no index at all, and _recover() rebuilds it from the log.
+            os.remove(self.index_path)
+            os.replace(tmp_log, self.path)
+            os.replace(tmp_idx, self.index_path)
+            self._index, self._latest = new_index, new_latest
+            self._log = open(self.path, "ab")
+            self._idx = open(self.index_path, "ab")
+        return dropped
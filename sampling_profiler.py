@@ -0,0 +1,140 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Optional
+
+# ================= CONFIG =================
+PROFILE_DIR = os.environ.get("HELIOS_PROFILE_DIR", "profiles")
+PROFILE_MODES = ("off", "auto", "always")   # auto: keep only requests slower than the threshold
+SAMPLE_INTERVAL = 0.005      # seconds between stack samples
+LATENCY_THRESHOLD = float(os.environ.get("HELIOS_PROFILE_THRESHOLD", "2.0"))
+MAX_DEPTH = 128              # frames kept per sample, innermost first
+MAX_PROFILE_FILES = 200
+MAX_PROFILE_BYTES = 20 * 1024 * 1024
+
+_prune_lock = threading.Lock()
+
+
+def default_mode() -> str:
+    # HELIOS_PROFILE=auto|always turns profiling on for a whole process
+    mode = os.environ.get("HELIOS_PROFILE", "off").lower()
+    return mode if mode in PROFILE_MODES else "off"
+
+
+# ================= SAMPLER =================
+class StackSampler(threading.Thread):
+    # Samples one thread's Python stack every `interval` seconds and counts
+    # identical stacks in collapsed form ("outer;...;inner"). Work the target
+    # hands to other threads (decode pools, to_thread) is not sampled.
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        super().__init__(daemon=True, name="helios-profiler")
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._labels = {}        # code object -> "file.py:function"
+        self._done = threading.Event()
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{os.path.basename(code.co_filename)}:{code.co_name}"
+        return label
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            parts = []
+            while frame is not None and len(parts) < MAX_DEPTH:
+                parts.append(self._label(frame.f_code))
+                frame = frame.f_back
+            if parts:
+                self.stacks[";".join(reversed(parts))] += 1
+                self.samples += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+# ================= OUTPUT =================
+def _prune(out_dir: str):
+    # Oldest profiles go first once either the file or the byte budget is exceeded
+    with _prune_lock:
+        files = []
+        for name in os.listdir(out_dir):
+            if name.endswith(".folded"):
+                path = os.path.join(out_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        while files and (len(files) > MAX_PROFILE_FILES or total > MAX_PROFILE_BYTES):
+            _, size, path = files.pop(0)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def write_collapsed(stacks: Counter, name: str, elapsed: float, out_dir: str = PROFILE_DIR) -> str:
+    # One "frame;frame;frame count" line per stack: the input format of
+    # flamegraph.pl, speedscope and inferno.
+    os.makedirs(out_dir, exist_ok=True)
+    slug = "".join(c if c.isalnum() or c in "-_" else "_" for c in name)[:40]
+    path = os.path.join(out_dir, f"{datetime.now():%Y%m%d-%H%M%S-%f}-{slug}-{elapsed * 1000:.0f}ms.folded")
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    _prune(out_dir)
+    return path
+
+
+def recent_profiles(out_dir: str = PROFILE_DIR, limit: int = 10) -> List[str]:
+    if not os.path.isdir(out_dir):
+        return []
+    paths = [os.path.join(out_dir, n) for n in os.listdir(out_dir) if n.endswith(".folded")]
+    return sorted(paths, key=os.path.getmtime, reverse=True)[:limit]
+
+
+# ================= REQUEST SCOPE =================
+class ProfileHandle:
+    def __init__(self, name: str, mode: str):
+        self.name = name
+        self.mode = mode
+        self.elapsed = None
+        self.samples = 0
+        self.path: Optional[str] = None    # set when a profile was written
+
+
+@contextmanager
+def profile_request(name: str, mode: Optional[str] = None, threshold: float = LATENCY_THRESHOLD,
+                    out_dir: str = PROFILE_DIR):
+    # Samples the calling thread for the duration of the block. "always"
+    # writes every profile; "auto" writes only when the block ran longer than
+    # `threshold` seconds; "off" (the default) costs nothing.
+    mode = (mode or default_mode()).lower()
+    handle = ProfileHandle(name, mode)
+    if mode not in ("auto", "always"):
+        yield handle
+        return
+
+    sampler = StackSampler(threading.get_ident())
+    start = time.perf_counter()
+    sampler.start()
+    try:
+        yield handle
+    finally:
+        sampler.stop()
+        handle.elapsed = time.perf_counter() - start
+        handle.samples = sampler.samples
+        if sampler.samples and (mode == "always" or handle.elapsed >= threshold):
+            handle.path = write_collapsed(sampler.stacks, name, handle.elapsed, out_dir)
@@ -0,0 +1,52 @@
+import json
+from typing import Any, Union
+
+from medical_models import MedicalReport
+
+# Optional fast path: orjson for JSON text, falling back to the stdlib json
+# module when the wheel is missing.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# ================= CONFIG =================
+# Bump when the stored report layout changes; stamped on every result_log record.
+SCHEMA_VERSION = 1
+
+
+# ================= JSON =================
+def dumps(obj: Any, sort_keys: bool = False, indent: bool = False) -> bytes:
+    # UTF-8 JSON bytes; anything not natively serializable goes through str()
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=str, option=option)
+    return json.dumps(obj, ensure_ascii=False, default=str, sort_keys=sort_keys,
+                      indent=2 if indent else None).encode("utf-8")
+
+
+def dumps_str(obj: Any, sort_keys: bool = False, indent: bool = False) -> str:
+    return dumps(obj, sort_keys=sort_keys, indent=indent).decode("utf-8")
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+# ================= REPORTS =================
+def parse_report(raw: Union[str, bytes]) -> MedicalReport:
+    # Raises pydantic.ValidationError on schema mismatch or malformed JSON
+    return MedicalReport.model_validate_json(raw)
+
+
+def report_dict(report: MedicalReport) -> dict:
+    # JSON-mode dump: enums become their string values, ready for any encoder
+    return report.model_dump(mode="json")
@@ -0,0 +1,94 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Tuple
+
+# ================= CONFIG =================
+MAX_WORKERS = 8     # speculative model calls running at once, across all sessions
+
+
+class _Job:
+    def __init__(self, key: str, future):
+        self.key = key
+        self.future = future
+        self.started = time.perf_counter()
+        self.finished = None
+        future.add_done_callback(self._done)
+
+    def _done(self, _future):
+        self.finished = time.perf_counter()
+
+
+# ================= PREFETCHER =================
+class Prefetcher:
+    # Starts the model call for an upload before the user asks for it. There
+    # is one job per (owner, kind), e.g. ("alice", "report"). start() with new
+    # inputs discards the old job: it is cancelled if it has not started yet,
+    # otherwise its result is dropped. run() claims a job whose key still
+    # matches, or calls fn itself when there is none (a miss). A claimed key
+    # is not prefetched again until the owner's upload goes away.
+    def __init__(self, max_workers: int = MAX_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="helios-prefetch")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._claimed = {}   # (owner, kind) -> key last handed to run()
+        self.stats = {"started": 0, "hits": 0, "misses": 0, "discarded": 0, "failed": 0, "saved_s": 0.0}
+
+    def _discard(self, job: _Job):
+        job.future.cancel()
+        self.stats["discarded"] += 1
+
+    def start(self, owner: str, kind: str, key: str, fn: Callable) -> bool:
+        # fn runs on a worker thread: it must not touch Streamlit APIs
+        with self._lock:
+            job = self._jobs.get((owner, kind))
+            if (job is not None and job.key == key) or self._claimed.get((owner, kind)) == key:
+                return False
+            if job is not None:
+                self._discard(job)
+            self._jobs[(owner, kind)] = _Job(key, self._pool.submit(fn))
+            self.stats["started"] += 1
+        return True
+
+    def discard(self, owner: str, kind: str):
+        with self._lock:
+            self._claimed.pop((owner, kind), None)
+            job = self._jobs.pop((owner, kind), None)
+            if job is not None:
+                self._discard(job)
+
+    def run(self, owner: str, kind: str, key: str, fn: Callable) -> Tuple[object, dict]:
+        # (result, {"hit": bool, "saved_s": seconds of work already done at claim time})
+        with self._lock:
+            self._claimed[(owner, kind)] = key
+            job = self._jobs.pop((owner, kind), None)
+            if job is not None and job.key != key:
+                self._discard(job)
+                job = None
+            if job is None:
+                self.stats["misses"] += 1
+        if job is None:
+            return fn(), {"hit": False, "saved_s": 0.0}
+
+        saved = (job.finished or time.perf_counter()) - job.started
+        try:
+            result = job.future.result()
+        except Exception:
+            # A failed speculative call is retried in the foreground, so the
+            # user sees the same error handling as without prefetch
+            with self._lock:
+                self.stats["failed"] += 1
+                self.stats["misses"] += 1
+            return fn(), {"hit": False, "saved_s": 0.0}
+        with self._lock:
+            self.stats["hits"] += 1
+            self.stats["saved_s"] += saved
+        return result, {"hit": True, "saved_s": saved}
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        claims = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / claims, 3) if claims else 0.0
+        stats["saved_s"] = round(stats["saved_s"], 2)
+        return stats
@@ -0,0 +1,46 @@
+import gzip
+
+import barcode_lookup
+from barcode_lookup import NutritionDB, build_database, read_off_export, scan_products
+from serialization import dumps
+
+OFF_RECORDS = [
+    {"code": "8901234567890", "product_name": "Masala Crisps", "countries_tags": ["en:india"],
+     "serving_quantity": "30", "allergens_tags": ["en:milk"],
+     "nutriments": {"sodium_100g": 1.5, "sugars_serving": 1.2, "saturated-fat_100g": "bad"}},
+    {"code": "0001", "product_name": "", "nutriments": {}},                       # unnamed: dropped
+    {"code": "4000000000001", "product_name": "Rye Bread", "countries_tags": ["en:germany"]},
+]
+
+
+def write_export(path):
+    with gzip.open(path, "wb") as f:
+        for record in OFF_RECORDS:
+            f.write(dumps(record) + b"\n")
+
+
+def test_off_export_becomes_per_serving_products(tmp_path):
+    export = str(tmp_path / "off.jsonl.gz")
+    write_export(export)
+    products = list(read_off_export(export, country="en:india"))
+    assert products == [{"barcode": "8901234567890", "name": "Masala Crisps",
+                         "nutrients": {"sodium_mg": 450.0, "sugar_g": 1.2}, "allergens": ["milk"]}]
+    assert [p["barcode"] for p in read_off_export(export)] == ["8901234567890", "4000000000001"]
+
+
+def test_database_lookup_and_scan(tmp_path, monkeypatch):
+    export, path = str(tmp_path / "off.jsonl.gz"), str(tmp_path / "db.jsonl")
+    write_export(export)
+    assert build_database(read_off_export(export), path) == 2
+    db = NutritionDB(path)
+    assert len(db) == 2
+    assert db.get("4000000000001")["name"] == "Rye Bread"
+    assert db.get("123") is None
+
+    # One code per fake "image" instead of a real zbar decode
+    monkeypatch.setattr(barcode_lookup, "_decode_one", lambda image: [image])
+    scan = scan_products(["8901234567890", "555"], db)
+    assert [p["name"] for p in scan["identified"]] == ["Masala Crisps"]
+    assert scan["unknown_codes"] == ["555"]
+    assert scan_products(["8901234567890"], None) == {"identified": [], "unknown_codes": ["8901234567890"]}
+    db.close()
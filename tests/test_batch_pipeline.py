@@ -0,0 +1,36 @@
+from batch_pipeline import LocalBatchServer, run_batch
+from lab_archive import query
+from serialization import dumps_str
+
+
+def test_valid_results_feed_the_lab_archive(tmp_path):
+    source = tmp_path / "reports"
+    source.mkdir()
+    for i in range(3):
+        (source / f"r{i}.txt").write_text(f"Report {i}")
+    result = {"patient_name": "Jane Doe", "date": "2026-01-05", "report_type": "LAB_REPORT", "clinical_summary": "",
+              "lab_results": [{"test_name": "Glucose", "value": "95", "unit": "mg/dL"}]}
+    backend = LocalBatchServer(lambda parts: dumps_str(result))
+    archive = str(tmp_path / "archive")
+
+    summary = run_batch(str(source), backend, interval=0.01, requests_path=str(tmp_path / "requests.jsonl"),
+                        results_path=str(tmp_path / "log.jsonl"), archive_root=archive)
+    assert summary["ok"] == 3
+    assert summary["archived_rows"] == 3
+    rows = query(["user", "marker_label", "value", "month"], root=archive).to_pylist()
+    assert rows == [{"user": "Jane Doe", "marker_label": "glucose", "value": 95.0, "month": "2026-01"}] * 3
+
+
+def test_schema_failures_are_invalid_and_not_archived(tmp_path):
+    source = tmp_path / "reports"
+    source.mkdir()
+    (source / "r0.txt").write_text("Report")
+    result = {"patient_name": "Jane Doe", "report_type": "LAB",   # not a DocType value
+              "lab_results": [{"test_name": "Glucose", "value": "300", "unit": "mg/dL"}]}
+    backend = LocalBatchServer(lambda parts: dumps_str(result))
+    archive = tmp_path / "archive"
+
+    summary = run_batch(str(source), backend, interval=0.01, requests_path=str(tmp_path / "requests.jsonl"),
+                        results_path=str(tmp_path / "log.jsonl"), archive_root=str(archive))
+    assert (summary["ok"], summary["invalid"], summary["archived_rows"]) == (0, 1, 0)
+    assert not archive.exists()
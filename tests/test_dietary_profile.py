@@ -0,0 +1,67 @@
+import pytest
+
+from barcode_lookup import find_conflicts
+from dietary_profile import constraints_prompt, derive_constraints
+
+PROFILE = {
+    "conditions": ["Type 2 Diabetes", "Hypertension"],
+    "lab_markers": {"Potassium": "5.6 mmol/L"},
+    "medications": ["Warfarin 5mg", "Atorvastatin 20mg"],
+}
+
+
+def test_goals_never_contradict_limits():
+    constraints = derive_constraints(PROFILE)
+    limited = {nutrient for nutrient, _, _ in constraints.nutrient_limits}
+    assert "potassium_mg" in limited
+    assert "potassium-rich vegetables" not in constraints.goals
+    assert "potassium-rich" not in constraints_prompt(constraints)
+
+
+def test_overlapping_avoid_items_are_merged():
+    constraints = derive_constraints({"conditions": ["GERD", "anxiety"]})
+    assert "coffee" in constraints.avoid
+    assert "excess coffee" not in constraints.avoid
+
+
+def test_cached_constraints_are_immutable():
+    constraints = derive_constraints(PROFILE)
+    with pytest.raises(AttributeError):
+        constraints.avoid.append("everything")
+    with pytest.raises(Exception):
+        constraints.avoid = ()
+    assert derive_constraints(dict(PROFILE)) is constraints
+
+
+def test_conflicts_report_limit_and_rule():
+    product = {"name": "Crisps", "nutrients": {"sodium_mg": 450, "potassium_mg": 200}}
+    assert find_conflicts(product, PROFILE) == ["sodium mg 450 exceeds 400 (hypertension)"]
+
+
+def test_unmatched_conditions_and_medications_reach_the_prompt():
+    prompt = constraints_prompt(derive_constraints({
+        "conditions": ["Phenylketonuria", "Lactose intolerance", "Pregnancy"],
+        "medications": ["Tranylcypromine", "Coumadin"],
+    }))
+    assert "Phenylketonuria, Lactose intolerance, Pregnancy" in prompt
+    assert "MAOIs" in prompt
+    assert "vitamin k 50mcg" in prompt
+    assert "Other medications" not in prompt
+
+
+def test_drugs_match_whole_words_only():
+    constraints = derive_constraints({"medications": ["Nystatin oral suspension", "Lipitor 20mg"]})
+    assert constraints.interactions == ("atorvastatin/simvastatin/lovastatin: no grapefruit",)
+    assert constraints.other_medications == ("Nystatin oral suspension",)
+
+
+def test_markers_use_canonical_names_and_units():
+    a1c = derive_constraints({"lab_markers": {"Hemoglobin A1c": "7.9 %"}})
+    assert "sugary drinks" in a1c.avoid
+    assert "tea with meals" not in a1c.avoid
+
+    clearance = derive_constraints({"lab_markers": {"Creatinine Clearance": "95 mL/min"}})
+    assert clearance.nutrient_limits == ()
+
+    glucose = derive_constraints({"lab_results": [{"test_name": "Glucose", "value": "8.2", "unit": "mmol/L"}]})
+    assert ("sugar_g", 10, "diabet") in glucose.nutrient_limits
@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+import extraction_service
+from extraction_service import ExtractionService
+from lab_archive import query
+
+REPORT = {"patient_name": "Jane Doe", "date": "2026-01-05", "lab_markers": {"Glucose": "95 mg/dL"}}
+
+
+def test_successful_extractions_are_archived(tmp_path, monkeypatch):
+    monkeypatch.setattr(extraction_service.analyser, "extract_text",
+                        lambda content: {"error": "bad"} if content == "bad" else dict(REPORT))
+    archive = str(tmp_path / "archive")
+    service = ExtractionService(archive_root=archive)
+
+    assert service._extract("ok", None)["patient_name"] == "Jane Doe"
+    assert service._extract("bad", None) == {"error": "bad"}
+    rows = query(["user", "marker_label", "value"], root=archive).to_pylist()
+    assert rows == [{"user": "Jane Doe", "marker_label": "glucose", "value": 95.0}]
+
+
+def test_dispatcher_bounds_in_flight_work(monkeypatch):
+    peak = []
+
+    def extract(self, content, owner):
+        peak.append(self.in_flight)
+        time.sleep(0.01)
+        return {"content": content}
+
+    monkeypatch.setattr(ExtractionService, "_extract", extract)
+
+    async def scenario():
+        service = ExtractionService(queue_size=8, max_concurrency=2)
+        service.start()
+        futures = service.submit_many([(str(i), None) for i in range(8)])
+        assert service.submit_many([("extra", None)]) is None   # queue full: 429
+        results = await asyncio.gather(*futures)
+        await service.stop()
+        return results
+
+    results = asyncio.run(scenario())
+    assert [r["content"] for r in results] == [str(i) for i in range(8)]
+    assert max(peak) <= 2
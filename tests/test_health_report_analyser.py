@@ -0,0 +1,18 @@
+from health_report_analyser import validate_report
+from serialization import dumps_str
+
+
+def lab_report(report_type):
+    return dumps_str({"report_type": report_type, "patient_name": "Jane Doe", "date": "2026-01-05",
+                      "lab_results": [{"test_name": "Glucose", "value": "300", "unit": "mg/dL",
+                                       "is_abnormal": False}]})
+
+
+def test_valid_report_is_flagged_locally():
+    assert validate_report(lab_report("LAB_REPORT"))["lab_results"][0]["is_abnormal"] is True
+
+
+def test_schema_failure_is_still_flagged_locally():
+    report = validate_report(lab_report("LAB"))   # not a DocType value
+    assert report["report_type"] == "LAB"
+    assert report["lab_results"][0]["is_abnormal"] is True
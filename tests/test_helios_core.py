@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+from helios_core import RECIPE_FIELDS, kitchen_markdown, parse_kitchen, parse_recipes
+
+KITCHEN = {
+    "detected_ingredients": ["spinach", "eggs"],
+    "nutritional_gaps": "omega-3",
+    "recipes": [
+        {"name": "Spinach omelette", "ingredients": ["spinach", "eggs"], "instructions": "Whisk and cook"},
+        {"name": "spinach OMELETTE", "prep_time": "5 min"},
+        {"prep_time": "unnamed"},
+    ],
+}
+
+
+def test_kitchen_reply_becomes_one_record_per_recipe():
+    analysis = parse_kitchen("```json\n" + json.dumps(KITCHEN) + "\n```")
+    assert [r["name"] for r in analysis["recipes"]] == ["Spinach omelette"]
+    assert set(analysis["recipes"][0]) == set(RECIPE_FIELDS)
+    assert analysis["recipes"][0]["instructions"] == ["Whisk and cook"]
+    assert analysis["nutritional_gaps"] == ["omega-3"]
+    assert analysis["shopping"] == []
+    assert kitchen_markdown(analysis) == ("### Detected Ingredients\n- spinach\n- eggs\n\n"
+                                          "### Nutritional Gap Analysis\n- omega-3")
+
+
+def test_prose_kitchen_reply_raises():
+    with pytest.raises(ValueError):
+        parse_kitchen("## Detected Ingredients\n- spinach")
+
+
+def test_recipe_pages_exclude_earlier_names():
+    text = json.dumps({"recipes": KITCHEN["recipes"]})
+    assert parse_recipes(text, exclude=["Spinach Omelette"]) == []
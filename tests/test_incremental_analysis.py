@@ -0,0 +1,89 @@
+from incremental_analysis import SectionIndex, incremental_extract
+
+MARKERS = [f"Marker{i}" for i in range(24)]
+
+
+def lab_report(glucose: str) -> str:
+    lines = ["Patient Information:", "Name: Jane Doe", "", "Lab Results:", f"Glucose: {glucose} mg/dL"]
+    lines += [f"{name}: {i + 10} mg/dL" for i, name in enumerate(MARKERS)]
+    return "\n".join(lines)
+
+
+def fake_extract(calls):
+    def extract(text):
+        calls.append(text)
+        markers = {}
+        for line in text.splitlines():
+            name, _, value = line.partition(": ")
+            if value.endswith("mg/dL"):
+                markers[name] = value.split()[0]
+        return {"lab_markers": markers}
+    return extract
+
+
+def test_changed_lab_value_is_sent_again(tmp_path):
+    index = SectionIndex(str(tmp_path / "index.json"))
+    calls = []
+    first, _ = incremental_extract(lab_report("95"), "jane", fake_extract(calls), index)
+    second, stats = incremental_extract(lab_report("310"), "jane", fake_extract(calls), index)
+
+    assert first["lab_markers"]["Glucose"] == "95"
+    assert second["lab_markers"]["Glucose"] == "310"
+    assert stats["sent"] == 1 and stats["reused"] == 1
+    assert stats["near_duplicates"] == 1
+    assert len(calls) == 2
+
+
+def test_identical_sections_are_reused(tmp_path):
+    index = SectionIndex(str(tmp_path / "index.json"))
+    calls = []
+    incremental_extract(lab_report("95"), "jane", fake_extract(calls), index)
+    report, stats = incremental_extract(lab_report("95"), "jane", fake_extract(calls), index)
+
+    assert len(calls) == 1
+    assert stats["sent"] == 0 and stats["skipped_fraction"] == 1.0
+    assert report["lab_markers"]["Glucose"] == "95"
+
+
+def test_comparison_sign_changes_the_hash(tmp_path):
+    index = SectionIndex(str(tmp_path / "index.json"))
+    calls = []
+    incremental_extract("Lab Results:\nHbA1c <7 %", "jane", fake_extract(calls), index)
+    incremental_extract("Lab Results:\nHbA1c >7 %", "jane", fake_extract(calls), index)
+    assert len(calls) == 2
+
+
+def test_owners_do_not_share_sections(tmp_path):
+    index = SectionIndex(str(tmp_path / "index.json"))
+    calls = []
+    incremental_extract(lab_report("95"), "jane", fake_extract(calls), index)
+    incremental_extract(lab_report("95"), "john", fake_extract(calls), index)
+    assert len(calls) == 2
+
+
+def test_separate_processes_merge_instead_of_overwrite(tmp_path):
+    # Streamlit, the CLI and the service each hold their own SectionIndex
+    path = str(tmp_path / "index.json")
+    streamlit, service = SectionIndex(path), SectionIndex(path)
+    incremental_extract(lab_report("95"), "jane", fake_extract([]), streamlit)
+    incremental_extract(lab_report("95"), "john", fake_extract([]), service)
+
+    merged = SectionIndex(path)
+    assert merged._data.keys() == {"jane", "john"}
+    calls = []
+    incremental_extract(lab_report("95"), "jane", fake_extract(calls), service)
+    assert calls == []
+
+
+def test_items_no_section_names_are_never_reused(tmp_path):
+    index = SectionIndex(str(tmp_path / "index.json"))
+    header = "Patient Information:\nName: Jane Doe\nDOB: 1970-01-01"
+    first = header + "\n\nLab Results:\nHemoglobin A1c 8.1 %\nFasting blood sugar 160 mg/dL"
+    second = header + "\n\nLipid Panel:\nLDL 150 mg/dL"
+    extract = lambda text: ({"lab_markers": {"HbA1c": "8.1 %", "Glucose": "160"}} if "A1c" in text
+                            else {"lab_markers": {"LDL": "150"}})
+    incremental_extract(first, "jane", extract, index)
+    report, stats = incremental_extract(second, "jane", extract, index)
+
+    assert stats["reused"] == 1   # the header
+    assert report["lab_markers"] == {"LDL": "150"}
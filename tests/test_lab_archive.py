@@ -0,0 +1,42 @@
+import os
+
+from lab_archive import archive_extraction, marker_distribution, query
+
+
+def entry(date, results):
+    return {"date": date, "lab_results": [{"test_name": name, "value": value, "unit": unit}
+                                          for name, value, unit in results]}
+
+
+def test_aliases_share_a_partition_in_canonical_units(tmp_path):
+    root = str(tmp_path)
+    archive_extraction("jane", entry("2026-01-05", [("HbA1c", "7.9", "%"), ("Glucose", "5.5", "mmol/L")]), root)
+    archive_extraction("jane", entry("2026-01-20", [("Hemoglobin A1c", "8.1", "%"), ("Glucose", "99", "mg/dL")]), root)
+    archive_extraction("jane", entry("2026-01-28", [("Glycated hemoglobin", "64", "mmol/mol")]), root)
+
+    assert sorted(os.listdir(tmp_path / "month=2026-01")) == ["marker=glucose", "marker=hba1c"]
+    glucose = marker_distribution("Fasting blood sugar", root=root)
+    assert (glucose["count"], glucose["unit"], glucose["skipped"]) == (2, "mg/dl", 0)
+    assert round(glucose["min"], 1) == 99.0 and round(glucose["max"], 1) == 99.1
+    assert marker_distribution("glycated hemoglobin", root=root)["count"] == 3
+
+
+def test_unconvertible_units_keep_their_own_label(tmp_path):
+    root = str(tmp_path)
+    archive_extraction("jane", entry("2026-01-05", [("Creatinine", "1.1", "mg/dL"),
+                                                    ("Creatinine Clearance", "95", "mL/min")]), root)
+    rows = query(["marker", "value", "unit"], root=root).to_pylist()
+    assert sorted(rows, key=lambda r: r["marker"]) == [
+        {"marker": "creatinine", "value": 1.1, "unit": "mg/dl"},
+        {"marker": "creatinine_clearance", "value": 95.0, "unit": "ml/min"},
+    ]
+
+
+def test_ingest_compacts_the_partitions_it_touches(tmp_path):
+    root = str(tmp_path)
+    for day in range(1, 5):
+        archive_extraction("jane", entry(f"2026-01-0{day}", [("LDL", str(100 + day), "mg/dL")]), root,
+                           compact_min_files=3)
+    files = os.listdir(tmp_path / "month=2026-01" / "marker=ldl")
+    assert len([f for f in files if f.endswith(".parquet")]) == 2   # 3 merged into 1, plus the 4th
+    assert query(["value"], root=root, markers=["LDL"]).num_rows == 4
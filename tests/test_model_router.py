@@ -0,0 +1,83 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import model_router
+from model_router import MIN_SAMPLES, ModelRouter, RouterUnavailable, direct_fallback
+
+TIERS = ["primary", "secondary", "lite"]
+
+
+class FakeModels:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+
+    def generate_content(self, model=None, contents=None, config=None):
+        self.calls.append((model, config))
+        if model in self.failing:
+            raise RuntimeError(f"{model} failed")
+        return SimpleNamespace(text=model)
+
+
+def make_router(failing=(), fallback=None):
+    models = FakeModels(failing)
+    return ModelRouter(SimpleNamespace(models=models), tiers=TIERS, fallback=fallback), models
+
+
+def test_fast_primary_failure_retries_next_tier():
+    router, models = make_router(failing={"primary"})
+    response = router.generate_content(model="primary", contents=["hi"])
+    assert response.text == "secondary"
+    assert [m for m, _ in models.calls] == ["primary", "secondary"]
+    assert router.snapshot()["retries"] == 1
+    assert router.snapshot()["hedges_fired"] == 0
+
+
+def test_retry_happens_only_once():
+    router, models = make_router(failing={"primary", "secondary"})
+    with pytest.raises(RuntimeError, match="secondary failed"):
+        router.generate_content(model="primary", contents=["hi"])
+    assert [m for m, _ in models.calls] == ["primary", "secondary"]
+
+
+def test_failed_half_open_probe_counts_as_reopen(monkeypatch):
+    router, _ = make_router()
+    for _ in range(MIN_SAMPLES):
+        router._record("primary", 0.1, False)
+    assert router.health["primary"].state == "open"
+    assert router.snapshot()["breaker_opened"] == 1
+
+    monkeypatch.setattr(model_router, "COOLDOWN", 0.0)
+    assert router._pick(0) == "primary"          # becomes the half-open probe
+    router._record("primary", 0.1, False)
+    assert router.health["primary"].state == "open"
+    assert router.snapshot()["breaker_opened"] == 2
+
+
+def test_all_tiers_open_uses_fallback_with_config():
+    raw = FakeModels()
+    router, _ = make_router(fallback=direct_fallback(SimpleNamespace(models=raw), "lite"))
+    now = time.monotonic()
+    for tier in router.health.values():
+        tier.state, tier.opened_at = "open", now
+    response = router.generate_content(model="primary", contents=["hi"], config={"temperature": 0})
+    assert response.text == "lite"
+    assert raw.calls == [("lite", {"temperature": 0})]
+    assert router.snapshot()["fallbacks"] == 1
+
+
+def test_all_tiers_open_without_fallback_raises():
+    router, _ = make_router()
+    for tier in router.health.values():
+        tier.state, tier.opened_at = "open", time.monotonic()
+    with pytest.raises(RouterUnavailable):
+        router.generate_content(contents=["hi"])
+
+
+def test_create_client_connects_fallback():
+    import helios_core
+
+    router = helios_core.create_client("test-key")
+    assert router.fallback is not None
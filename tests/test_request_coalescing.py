@@ -0,0 +1,66 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from request_coalescing import SingleFlight, content_key
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    entered, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        entered.set()
+        release.wait(5)
+        return "report"
+
+    with ThreadPoolExecutor(4) as pool:
+        leader = pool.submit(flight.do, "k", slow)
+        assert entered.wait(5)
+        followers = [pool.submit(flight.do, "k", slow) for _ in range(3)]
+        while flight.snapshot()["calls"] < 4:
+            time.sleep(0.01)
+        release.set()
+        results = [leader.result(5)] + [f.result(5) for f in followers]
+
+    assert results == ["report"] * 4
+    assert calls == [1]
+    stats = flight.snapshot()
+    assert stats["executed"] == 1 and stats["deduplicated"] == 3
+    assert flight.in_flight() == 0
+
+
+def test_error_reaches_every_waiter_and_is_not_cached():
+    flight = SingleFlight()
+    entered, release = threading.Event(), threading.Event()
+
+    def broken():
+        entered.set()
+        release.wait(5)
+        raise RuntimeError("quota")
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flight.do, "k", broken)
+        assert entered.wait(5)
+        follower = pool.submit(flight.do, "k", broken)
+        while flight.snapshot()["calls"] < 2:
+            time.sleep(0.01)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(RuntimeError, match="quota"):
+                future.result(5)
+
+    assert flight.snapshot()["errors"] == 1
+    assert flight.do("k", lambda: "retried") == "retried"
+
+
+def test_content_key_depends_on_every_part():
+    base = content_key("flash", ["prompt", b"report"], {"temperature": 0})
+    assert base == content_key("flash", ["prompt", b"report"], {"temperature": 0})
+    assert base != content_key("pro", ["prompt", b"report"], {"temperature": 0})
+    assert base != content_key("flash", ["prompt", b"report 2"], {"temperature": 0})
+    assert base != content_key("flash", ["promptreport"], {"temperature": 0})
@@ -0,0 +1,86 @@
+import os
+
+import result_log
+from batch_pipeline import LocalBatchServer, run_batch
+from result_log import ResultLog
+from serialization import dumps_str
+
+
+def report(name="Jane Doe", date="2026-01-05", summary="", **extra):
+    return {"patient_name": name, "date": date, "report_type": "LAB_REPORT", "clinical_summary": summary, **extra}
+
+
+def test_same_day_reports_survive_compaction(tmp_path):
+    log = ResultLog(str(tmp_path / "log.jsonl"))
+    log.append(report(summary="morning panel"))
+    log.append(report(summary="evening panel"))
+    log.append({"error": "Quota exceeded", "source_key": "a.txt"})
+    log.append({"error": "Quota exceeded", "source_key": "b.txt"})
+    assert log.compact() == 0
+    assert len(log) == 4
+    assert log.get("jane doe", "2026-01-05", "lab_report")["clinical_summary"] == "evening panel"
+    log.close()
+
+
+def test_compaction_drops_only_true_duplicates(tmp_path):
+    log = ResultLog(str(tmp_path / "log.jsonl"))
+    log.append(report(summary="panel"))
+    log.append(report(summary="panel"))
+    log.append(report(summary="other", source_key="x.txt"))
+    log.append(report(summary="rerun", source_key="x.txt"))
+    assert log.compact() == 2
+    assert sorted(r["clinical_summary"] for r in log.scan("Jane Doe")) == ["panel", "rerun"]
+    log.close()
+
+
+def test_recovery_drops_torn_tail_and_reindexes(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    log = ResultLog(path)
+    log.append(report(summary="kept"))
+    log.close()
+    with open(path, "ab") as f:
+        f.write(b'{"patient_name": "torn')
+    os.remove(path + ".idx")
+
+    log = ResultLog(path)
+    assert len(log) == 1
+    assert log.get("Jane Doe", "2026-01-05", "LAB_REPORT")["clinical_summary"] == "kept"
+    log.append(report(summary="next"))
+    log.close()
+    log = ResultLog(path)
+    assert len(log) == 2
+    log.close()
+
+
+def test_old_three_part_index_is_rebuilt(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    log = ResultLog(path)
+    log.append(report(summary="a"))
+    log.append(report(summary="b"))
+    log.close()
+    line = open(path, "rb").read().split(b"\n")[0] + b"\n"
+    raw_key = "jane doe\x1f2026-01-05\x1fLAB_REPORT".encode()
+    with open(path + ".idx", "wb") as f:
+        f.write(result_log._ENTRY.pack(0, len(line), len(raw_key)) + raw_key)
+
+    log = ResultLog(path)
+    assert len(log) == 2
+    assert log.get("Jane Doe", "2026-01-05", "LAB_REPORT")["clinical_summary"] == "b"
+    log.close()
+
+
+def test_batch_keeps_one_record_per_source(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_log, "COMPACT_CHECK_EVERY", 16)
+    source = tmp_path / "reports"
+    source.mkdir()
+    for i in range(60):
+        (source / f"r{i}.txt").write_text(f"Report {i}")
+    backend = LocalBatchServer(lambda parts: dumps_str({"report_type": "OTHER", "clinical_summary": "same"}))
+    log_path = str(tmp_path / "log.jsonl")
+
+    summary = run_batch(str(source), backend, interval=0.01,
+                        requests_path=str(tmp_path / "requests.jsonl"), results_path=log_path)
+    assert summary["ok"] == 60
+    log = ResultLog(log_path)
+    assert len(log) == 60
+    log.close()
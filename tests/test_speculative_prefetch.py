@@ -0,0 +1,98 @@
+import threading
+
+from speculative_prefetch import Prefetcher
+
+
+def counting(result, calls):
+    def fn():
+        calls.append(result)
+        return result
+    return fn
+
+
+def test_finished_job_is_a_hit():
+    prefetcher = Prefetcher(max_workers=1)
+    calls = []
+    assert prefetcher.start("jane", "report", "k1", counting("speculative", calls))
+    prefetcher._jobs[("jane", "report")].future.result(timeout=5)
+
+    result, info = prefetcher.run("jane", "report", "k1", counting("foreground", calls))
+
+    assert result == "speculative" and info["hit"]
+    assert calls == ["speculative"]
+    assert not prefetcher.start("jane", "report", "k1", counting("again", calls))
+    assert prefetcher.snapshot()["hits"] == 1
+
+
+def test_running_job_is_awaited_and_is_a_hit():
+    prefetcher = Prefetcher(max_workers=1)
+    running, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow():
+        running.set()
+        release.wait(5)
+        return "speculative"
+
+    prefetcher.start("jane", "report", "k1", slow)
+    assert running.wait(5)
+    threading.Timer(0.05, release.set).start()
+
+    result, info = prefetcher.run("jane", "report", "k1", counting("foreground", calls))
+
+    assert result == "speculative" and info["hit"]
+    assert calls == []
+
+
+def test_key_mismatch_after_reupload_runs_in_foreground():
+    prefetcher = Prefetcher(max_workers=1)
+    calls = []
+    prefetcher.start("jane", "report", "old-upload", counting("stale", calls))
+    prefetcher._jobs[("jane", "report")].future.result(timeout=5)
+
+    result, info = prefetcher.run("jane", "report", "new-upload", counting("foreground", calls))
+
+    assert result == "foreground" and not info["hit"]
+    stats = prefetcher.snapshot()
+    assert stats["misses"] == 1 and stats["discarded"] == 1
+
+
+def test_discard_cancels_a_queued_job():
+    prefetcher = Prefetcher(max_workers=1)
+    running, release = threading.Event(), threading.Event()
+    calls = []
+
+    def blocker():
+        running.set()
+        release.wait(5)
+
+    prefetcher.start("alice", "report", "a", blocker)
+    assert running.wait(5)
+    prefetcher.start("jane", "report", "k1", counting("queued", calls))
+    queued = prefetcher._jobs[("jane", "report")].future
+
+    prefetcher.discard("jane", "report")
+    release.set()
+    prefetcher._pool.shutdown(wait=True)
+
+    assert queued.cancelled()
+    assert calls == []
+    assert prefetcher.snapshot()["discarded"] == 1
+
+
+def test_failed_speculative_job_falls_back_to_foreground():
+    prefetcher = Prefetcher(max_workers=1)
+    calls = []
+
+    def broken():
+        raise RuntimeError("model unavailable")
+
+    prefetcher.start("jane", "report", "k1", broken)
+    prefetcher._jobs[("jane", "report")].future.exception(timeout=5)
+
+    result, info = prefetcher.run("jane", "report", "k1", counting("foreground", calls))
+
+    assert result == "foreground" and not info["hit"]
+    assert calls == ["foreground"]
+    stats = prefetcher.snapshot()
+    assert stats["failed"] == 1 and stats["misses"] == 1 and stats["hits"] == 0
@@ -0,0 +1,73 @@
+import numpy as np
+
+from reference_ranges import HistoryFlags
+from trend_series import RollingTrends, RollingWindow, downsample
+
+
+def entry(date, markers):
+    return {"timestamp": date, "data": {"lab_markers": markers}}
+
+
+def test_rolling_window_matches_naive():
+    rng = np.random.default_rng(0)
+    values = rng.normal(100, 20, 200)
+    window = RollingWindow(7)
+    for i, value in enumerate(values):
+        mean, low, high = window.push(value)
+        tail = values[max(0, i - 6):i + 1]
+        assert np.isclose(mean, tail.mean())
+        assert low == tail.min() and high == tail.max()
+
+
+def test_update_pushes_only_new_readings():
+    history = [entry(f"2026-01-0{d}", {"Glucose": f"{90 + d} mg/dL"}) for d in range(1, 4)]
+    flags = HistoryFlags().update(history)
+    trends = RollingTrends(3).update(flags)
+    history.append(entry("2026-01-04", {"Glucose": "120 mg/dL"}))
+    trends.update(flags.update(history))
+
+    series = trends.series["glucose"]
+    assert series.values == [91, 92, 93, 120]
+    assert np.isclose(series.mean[-1], (92 + 93 + 120) / 3)
+    assert series.status[-1] == 2  # high
+
+
+def test_out_of_order_reading_rebuilds_marker():
+    history = [entry("2026-01-03", {"LDL": "100 mg/dL"}), entry("2026-01-01", {"LDL": "140 mg/dL"})]
+    trends = RollingTrends(2).update(HistoryFlags().update(history))
+    series = trends.series["ldl"]
+    assert series.dates == ["2026-01-01", "2026-01-03"]
+    assert series.values == [140, 100]
+    assert series.max == [140, 140]
+
+
+def test_cleared_history_rebuilds_all_markers():
+    # Trends are not updated while the history is empty, only the flags are
+    old = [entry(f"2026-01-{d:02d}", {"Glucose": "95 mg/dL", "LDL": "120 mg/dL"}) for d in range(1, 6)]
+    flags = HistoryFlags().update(old)
+    trends = RollingTrends().update(flags)
+    assert len(flags.records) == 10
+
+    flags.update([])
+    new = [entry("2026-02-01", {f"m{i}": f"{i} mg/dL" for i in range(12)})]
+    trends.update(flags.update(new))
+
+    assert trends.markers() == sorted(f"m{i}" for i in range(12))
+
+
+def test_profile_change_rebuilds_statuses():
+    history = [entry("2026-01-01", {"Hemoglobin": "12.5 g/dL"})]
+    flags = HistoryFlags().update(history)
+    trends = RollingTrends().update(flags)
+    assert trends.series["hemoglobin"].status == [0]
+    trends.update(flags.update(history, sex="M"))
+    assert trends.series["hemoglobin"].status == [1]  # low for men
+
+
+def test_downsample_keeps_flagged_points():
+    x = np.arange(5000)
+    y = np.sin(x / 100.0)
+    keep = np.zeros(5000, dtype=bool)
+    keep[1234] = True
+    idx = downsample(x, y, 100, keep)
+    assert len(idx) <= 101 and 1234 in idx and idx[0] == 0 and idx[-1] == 4999
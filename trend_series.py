@@ -0,0 +1,138 @@
+from collections import deque
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# ================= CONFIG =================
+MAX_CHART_POINTS = 400     # per series, after downsampling
+DEFAULT_WINDOW = 7         # readings per rolling window
+
+
+# ================= DOWNSAMPLING =================
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int = MAX_CHART_POINTS) -> np.ndarray:
+    # Largest-Triangle-Three-Buckets: indices of `threshold` points that keep
+    # the visual shape of the series. First and last points are always kept.
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)  # buckets over the inner points
+    picked = np.empty(threshold, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) is the third vertex
+        nxt_end = edges[i + 2] if i + 2 < len(edges) else n
+        nxt = slice(end, max(nxt_end, end + 1))
+        cx, cy = x[nxt].mean(), y[nxt].mean()
+        bx, by = x[start:end], y[start:end]
+        area = np.abs((x[a] - cx) * (by - y[a]) - (x[a] - bx) * (cy - y[a]))
+        a = start + int(np.argmax(area))
+        picked[i + 1] = a
+    return picked
+
+
+def downsample(x: np.ndarray, y: np.ndarray, threshold: int = MAX_CHART_POINTS,
+               keep: Optional[np.ndarray] = None) -> np.ndarray:
+    # LTTB indices plus any points flagged in `keep` (e.g. critical readings),
+    # so downsampling never hides an out-of-range value. NaN values are skipped.
+    valid = np.flatnonzero(~np.isnan(np.asarray(y, dtype=np.float64)))
+    chosen = valid[lttb(np.asarray(x)[valid], np.asarray(y)[valid], threshold)]
+    if keep is not None:
+        chosen = np.union1d(chosen, np.flatnonzero(keep))
+    return chosen
+
+
+# ================= ROLLING WINDOWS =================
+class RollingWindow:
+    # Mean/min/max over the last `size` values in O(1) amortized per push:
+    # a running sum for the mean and monotonic deques for the extremes.
+    def __init__(self, size: int = DEFAULT_WINDOW):
+        self.size = size
+        self._values = deque()
+        self._sum = 0.0
+        self._min = deque()   # (index, value), values increasing
+        self._max = deque()   # (index, value), values decreasing
+        self._count = 0
+
+    def push(self, value: float):
+        i = self._count
+        self._count += 1
+        self._values.append(value)
+        self._sum += value
+        if len(self._values) > self.size:
+            self._sum -= self._values.popleft()
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((i, value))
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((i, value))
+        oldest = i - self.size + 1
+        if self._min[0][0] < oldest:
+            self._min.popleft()
+        if self._max[0][0] < oldest:
+            self._max.popleft()
+        return self._sum / len(self._values), self._min[0][1], self._max[0][1]
+
+
+class MarkerSeries:
+    def __init__(self, window: int):
+        self.window = RollingWindow(window)
+        self.dates: List[str] = []
+        self.values: List[float] = []
+        self.status: List[int] = []
+        self.mean: List[float] = []
+        self.min: List[float] = []
+        self.max: List[float] = []
+
+    def append(self, date: str, value: float, status: int):
+        mean, low, high = self.window.push(value)
+        self.dates.append(date)
+        self.values.append(value)
+        self.status.append(status)
+        self.mean.append(mean)
+        self.min.append(low)
+        self.max.append(high)
+
+
+class RollingTrends:
+    # Per-marker series with rolling stats, fed from HistoryFlags. update()
+    # only pushes readings added since the last call. A reading dated before
+    # its marker's last point rebuilds just that marker in date order.
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self.window = window
+        self.series: Dict[str, MarkerSeries] = {}
+        self._seen = 0
+        self._source = None   # (flags object, flags.generation) the series were built from
+
+    def update(self, flags, window: Optional[int] = None) -> "RollingTrends":
+        window = window or self.window
+        source = (id(flags), flags.generation)
+        if window != self.window or source != self._source or len(flags.records) < self._seen:
+            self.__init__(window)
+            self._source = source
+        rebuild = set()
+        for i in range(self._seen, len(flags.records)):
+            record = flags.records[i]
+            # Canonical units where the reference table knows the marker, raw otherwise
+            value = float(flags.values[i])
+            if value != value:
+                value = float(record["value"])
+            series = self.series.setdefault(record["marker"], MarkerSeries(self.window))
+            if series.dates and record["date"] < series.dates[-1]:
+                rebuild.add(record["marker"])
+            series.append(record["date"], value, int(flags.status[i]))
+        for marker in rebuild:
+            old = self.series[marker]
+            fresh = MarkerSeries(self.window)
+            for j in sorted(range(len(old.dates)), key=lambda j: old.dates[j]):
+                fresh.append(old.dates[j], old.values[j], old.status[j])
+            self.series[marker] = fresh
+        self._seen = len(flags.records)
+        return self
+
+    def markers(self) -> List[str]:
+        return sorted(self.series)